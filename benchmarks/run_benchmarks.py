@@ -0,0 +1,363 @@
+import argparse
+import cProfile
+import json
+import platform
+import pstats
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+from itertools import product
+from pathlib import Path
+import numpy as np
+import polars as pl
+from loguru import logger
+from src.asset_data import AssetData
+from src.backtester import Backtester
+from src.optimizer import Optimizer
+from src.portfolios import Portfolios
+from src.providers import FakeProvider
+
+'''
+Benchmarks for the portfolio pipeline on synthetic prices from FakeProvider, so runs are
+reproducible and never touch the network. Every case runs in its own subprocess, timed over
+a parameter grid (best and median of several repeats); peak memory is how far that process's
+RSS rose above where setup left it, so NumPy, polars and Arrow buffers all count. Results go to a JSON file that `compare`
+checks against a baseline run.
+
+    python -m benchmarks.run_benchmarks run --output bench.json [--quick] [--profile DIR]
+    python -m benchmarks.run_benchmarks compare baseline.json bench.json [--threshold 0.1]
+'''
+START_DATE = date(2000, 1, 3)
+
+GRIDS = {
+    'cache_save': {'tickers': [50, 200], 'days': [500, 2500]},
+    'cache_load': {'tickers': [50, 200], 'days': [500, 2500]},
+    'returns_covariance': {'tickers': [50, 200, 500], 'days': [500, 2500]},
+    'efficient_frontier': {'tickers': [10, 100, 500], 'portfolios': [10000, 100000]},
+    'random_portfolios': {'tickers': [200], 'days': [750], 'portfolios': [10000, 100000]},
+    'backtester': {'tickers': [50, 200], 'days': [750, 2500], 'portfolios': [1, 100]},
+}
+
+QUICK_GRIDS = {
+    'cache_save': {'tickers': [20], 'days': [250]},
+    'cache_load': {'tickers': [20], 'days': [250]},
+    'returns_covariance': {'tickers': [50], 'days': [250]},
+    'efficient_frontier': {'tickers': [20], 'portfolios': [10000]},
+    'random_portfolios': {'tickers': [50], 'days': [250], 'portfolios': [10000]},
+    'backtester': {'tickers': [20], 'days': [250], 'portfolios': [10]},
+}
+
+
+def end_date(days):
+    # FakeProvider emits weekdays only, so `days` trading days span about days * 7 / 5 calendar days
+    return START_DATE + timedelta(days=days * 7 // 5)
+
+
+def write_holdings(path, num_tickers):
+    pl.DataFrame({
+        'Stock name': [f'Stock {i}' for i in range(num_tickers)],
+        'Ticker symbol': [f'T{i}' for i in range(num_tickers)],
+        'Shares owned': list(range(1, num_tickers + 1)),
+        'Purchase price': [1.0] * num_tickers,
+        'Current price': [1.0] * num_tickers,
+        'Total value': [1.0] * num_tickers,
+    }).write_csv(path)
+
+
+class Workspace:
+    # Temporary holdings file and price caches, reused across the cases (and case processes) of a run
+    def __init__(self, root=None):
+        self.root = Path(root) if root is not None else Path(tempfile.mkdtemp(prefix='portfolio-bench-'))
+
+    def holdings(self, num_tickers):
+        path = self.root / f'holdings-{num_tickers}.csv'
+        if not path.exists():
+            write_holdings(path, num_tickers)
+        return path
+
+    def asset_data(self, num_tickers, cache_dir):
+        return AssetData(self.holdings(num_tickers), cache_dir=cache_dir, provider=FakeProvider())
+
+    def cold_asset_data(self, num_tickers):
+        cache_dir = self.root / 'cold'
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        return self.asset_data(num_tickers, cache_dir)
+
+    def warm_asset_data(self, num_tickers, days):
+        # A fresh AssetData (empty in-memory cache) over a price store that already holds the window
+        cache_dir = self.root / f'warm-{num_tickers}-{days}'
+        if not cache_dir.is_dir():
+            self.asset_data(num_tickers, cache_dir).fetch_all_stock_histories(START_DATE, end_date(days))
+        return self.asset_data(num_tickers, cache_dir)
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+# Each stage takes (workspace, params) and returns the function to measure; setup work done
+# before returning is not timed.
+def stage_cache_save(workspace, params):
+    def run():
+        asset_data = workspace.cold_asset_data(params['tickers'])
+        asset_data.fetch_all_stock_histories(START_DATE, end_date(params['days']))
+    return run
+
+
+def stage_cache_load(workspace, params):
+    workspace.warm_asset_data(params['tickers'], params['days'])
+
+    def run():
+        asset_data = workspace.warm_asset_data(params['tickers'], params['days'])
+        asset_data.load_cached_histories([ticker for _, ticker, _ in asset_data.get_holdings()])
+    return run
+
+
+def stage_returns_covariance(workspace, params):
+    asset_data = workspace.warm_asset_data(params['tickers'], params['days'])
+    tickers = [ticker for _, ticker, _ in asset_data.get_holdings()]
+    asset_data.load_cached_histories(tickers)
+
+    def run():
+        # Drop the persisted estimator too, so every repeat builds the covariance from scratch
+        asset_data.universe_cache.clear()
+        shutil.rmtree(asset_data.universe_cache.estimator_dir, ignore_errors=True)
+        asset_data.get_universe_stats(START_DATE, end_date(params['days']))
+    return run
+
+
+def stage_efficient_frontier(workspace, params):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0.0005, 0.01, (500, params['tickers']))
+    optimizer = Optimizer.from_moments(returns.mean(axis=0), np.cov(returns, rowvar=False))
+
+    def run():
+        optimizer.calculate_efficient_frontier(params['portfolios'], seed=0)
+    return run
+
+
+def stage_random_portfolios(workspace, params):
+    asset_data = workspace.warm_asset_data(params['tickers'], params['days'])
+    portfolios = Portfolios(asset_data, start_date=START_DATE, end_date=end_date(params['days']))
+    portfolios.universe_stats()
+
+    def run():
+        portfolios.create_random_portfolios(params['portfolios'], seed=0)
+    return run
+
+
+def stage_backtester(workspace, params):
+    asset_data = workspace.warm_asset_data(params['tickers'], params['days'])
+    tickers = [ticker for _, ticker, _ in asset_data.get_holdings()]
+    backtester = Backtester(asset_data, start_date=START_DATE, end_date=end_date(params['days']))
+    backtester.load_prices(tickers)
+    weights = np.random.default_rng(0).dirichlet(np.ones(len(tickers)), params['portfolios'])
+
+    def run():
+        backtester.run(weights, tickers, rebalance='monthly', transaction_cost=0.001)
+    return run
+
+
+STAGES = {
+    'cache_save': stage_cache_save,
+    'cache_load': stage_cache_load,
+    'returns_covariance': stage_returns_covariance,
+    'efficient_frontier': stage_efficient_frontier,
+    'random_portfolios': stage_random_portfolios,
+    'backtester': stage_backtester,
+}
+
+
+def case_name(stage, params):
+    return stage + ''.join(f'-{key}{value}' for key, value in params.items())
+
+
+def grid_cases(grid):
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in product(*grid.values())]
+
+
+def max_rss():
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+def proc_status(field):
+    # Memory fields of /proc/self/status in bytes, or None where there is no procfs
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(f'{field}:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    # Linux resets the RSS high-water mark (VmHWM) when '5' is written to clear_refs, so the
+    # stage's own peak is measured even when setup went higher. Returns the RSS to measure from.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        return max_rss()
+    return proc_status('VmRSS')
+
+
+def measure(run, repeats):
+    # peak_memory is the stage's own high-water mark above the RSS left by setup
+    setup_memory = reset_peak_rss()
+    run()  # warm-up
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        run()
+        timings.append(time.perf_counter() - start)
+    peak = proc_status('VmHWM') or max_rss()
+    return {
+        'time_min': min(timings), 'time_median': float(np.median(timings)), 'repeats': repeats,
+        'peak_memory': max(peak - setup_memory, 0), 'setup_memory': setup_memory,
+    }
+
+
+def run_case(workspace_root, stage, params, repeats, profile_dir=None):
+    # Body of the case subprocess: a fresh interpreter, so RSS belongs to this case alone
+    run = STAGES[stage](Workspace(workspace_root), params)
+    result = measure(run, repeats)
+    if profile_dir is not None:
+        profile(run, Path(profile_dir) / case_name(stage, params))
+    return result
+
+
+def spawn_case(workspace, stage, params, repeats, profile_dir=None):
+    command = [sys.executable, '-m', 'benchmarks.run_benchmarks', 'case', stage, json.dumps(params),
+               '--workspace', str(workspace.root), '--repeats', str(repeats)]
+    if profile_dir is not None:
+        command += ['--profile', str(profile_dir)]
+    completed = subprocess.run(command, stdout=subprocess.PIPE, text=True, check=True, cwd=Path(__file__).resolve().parents[1])
+    return json.loads(completed.stdout.splitlines()[-1])
+
+
+def profile(run, path):
+    profiler = cProfile.Profile()
+    profiler.enable()
+    run()
+    profiler.disable()
+    profiler.dump_stats(path.with_suffix('.prof'))
+    with open(path.with_suffix('.txt'), 'w') as f:
+        pstats.Stats(profiler, stream=f).sort_stats('cumulative').print_stats(40)
+
+    tracemalloc.start(25)
+    run()
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    with open(path.with_name(path.name + '-memory.txt'), 'w') as f:
+        for stat in snapshot.statistics('lineno')[:40]:
+            f.write(f'{stat}\n')
+
+
+def run_benchmarks(stages, grids, repeats, profile_dir=None):
+    workspace = Workspace()
+    results = []
+    try:
+        for stage in stages:
+            for params in grid_cases(grids[stage]):
+                name = case_name(stage, params)
+                result = {'name': name, 'stage': stage, 'params': params,
+                          **spawn_case(workspace, stage, params, repeats, profile_dir)}
+                results.append(result)
+                print(f"{name:60s} {result['time_min'] * 1000:10.1f} ms {result['peak_memory'] / 2**20:10.1f} MiB")
+    finally:
+        workspace.cleanup()
+    return {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'polars': pl.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=0.1):
+    # Flags cases whose best time or peak memory grew by more than `threshold` (relative)
+    baseline_results = {result['name']: result for result in baseline['results']}
+    regressions = []
+    print(f"{'case':60s} {'time':>10s} {'memory':>10s}")
+    for result in current['results']:
+        base = baseline_results.get(result['name'])
+        if base is None:
+            print(f"{result['name']:60s} {'new':>10s}")
+            continue
+        time_change = result['time_min'] / base['time_min'] - 1
+        memory_change = result['peak_memory'] / base['peak_memory'] - 1 if base['peak_memory'] else 0.0
+        flags = [label for label, change in (('time', time_change), ('memory', memory_change)) if change > threshold]
+        if flags:
+            regressions.append((result['name'], flags))
+        print(f"{result['name']:60s} {time_change:+10.1%} {memory_change:+10.1%}{'  REGRESSION' if flags else ''}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the portfolio pipeline on synthetic data.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run the benchmark grid')
+    run_parser.add_argument('--output', default='bench.json')
+    run_parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    run_parser.add_argument('--repeats', type=int, default=3)
+    run_parser.add_argument('--quick', action='store_true', help='small grid for smoke runs')
+    run_parser.add_argument('--profile', metavar='DIR', help='write cProfile and tracemalloc reports per case')
+
+    # Internal: one case in a fresh process, result as a JSON line on stdout
+    case_parser = commands.add_parser('case')
+    case_parser.add_argument('stage', choices=list(STAGES))
+    case_parser.add_argument('params', type=json.loads)
+    case_parser.add_argument('--workspace', required=True)
+    case_parser.add_argument('--repeats', type=int, default=3)
+    case_parser.add_argument('--profile')
+
+    compare_parser = commands.add_parser('compare', help='compare two benchmark runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1)
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+        if args.profile:
+            Path(args.profile).mkdir(parents=True, exist_ok=True)
+        report = run_benchmarks(args.stages, QUICK_GRIDS if args.quick else GRIDS, args.repeats, args.profile)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {len(report["results"])} results to {args.output}')
+        return 0
+
+    if args.command == 'case':
+        logger.remove()
+        logger.add(sys.stderr, level='WARNING')
+        print(json.dumps(run_case(args.workspace, args.stage, args.params, args.repeats, args.profile)))
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s) above {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
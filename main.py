@@ -1,56 +1,158 @@
+import argparse
+import sys
 from datetime import datetime, timedelta
 from loguru import logger
-from src.asset_data import AssetData
-from src.portfolios import Portfolios
-
-def main():
-    logger.info("Starting the main function")
-    
-    # Create AssetData instance
-    logger.info("Creating AssetData instance")
-    asset_data = AssetData('data/portfolio_positions.csv')
-
-    # Define date range for 20 years
-    end_date = datetime.now().strftime('%Y-%m-%d')
-    start_date = (datetime.now() - timedelta(days=20*365)).strftime('%Y-%m-%d')
-    logger.info(f"Date range defined: Start Date - {start_date}, End Date - {end_date}")
-    
-    # Fetch stock histories for all holdings
-    logger.info("Fetching stock histories for all holdings")
-    stock_histories = asset_data.fetch_all_stock_histories(start_date, end_date)
-    
-    # Check if stock histories were fetched successfully
-    if stock_histories:
-        logger.info("Stock histories fetched successfully")
-    else:
-        logger.warning("No stock histories found")
-
-    # Create Portfolios instance
-    logger.info("Creating Portfolios instance")
-    portfolios = Portfolios(asset_data)
-    
-    # Create portfolio from holdings
-    logger.info("Creating portfolio from holdings")
-    current_portfolio = portfolios.create_portfolio_from_holdings()
-    
-    # Create ten random portfolios
-    logger.info("Creating ten random portfolios")
-    portfolios.create_random_portfolios(10)
-    
-    # Print the current portfolio and random portfolios
-    logger.info("Printing the current portfolio and random portfolios")
-    print("Current Portfolio:")
-    print(current_portfolio)
-    
-    print("Random Portfolios:")
-    for portfolio in portfolios.portfolios:
-        print(portfolio)
-    
-    # Plot the efficient frontier chart
-    target_return = 0.08  # Example target return
-    logger.info(f"Plotting the efficient frontier chart with target return: {target_return}")
-    portfolios.plot_efficient_frontier(target_return, file_path='efficient_frontier.png')
-    logger.info("Efficient frontier chart saved as 'efficient_frontier.png'.")
+
+'''
+Command line entry point. Each subcommand imports only what it uses, so cached runs that
+never fetch or plot do not pay for yfinance, matplotlib or scipy at startup.
+
+    python main.py fetch                      download/refresh 20 years of history
+    python main.py metrics                    current portfolio metrics from the cache
+    python main.py frontier --portfolios 100000 --output efficient_frontier.png
+    python main.py backtest --rebalance quarterly --transaction-cost 0.001
+    python main.py search --num-stocks 10 --top-k 5 --time-budget 60
+'''
+DEFAULT_HOLDINGS = 'data/portfolio_positions.csv'
+
+
+def make_asset_data(args):
+    from src.asset_data import AssetData
+    from src.providers import create_provider
+    return AssetData(args.holdings, cache_dir=args.cache_dir, provider=create_provider(args.provider), num_factors=args.num_factors)
+
+
+def fetch(args):
+    asset_data = make_asset_data(args)
+    end_date = args.end or datetime.now().strftime('%Y-%m-%d')
+    start_date = args.start or (datetime.now() - timedelta(days=20*365)).strftime('%Y-%m-%d')
+    logger.info(f"Fetching stock histories for all holdings from {start_date} to {end_date}")
+    stock_histories = asset_data.fetch_all_stock_histories(start_date, end_date, max_workers=args.workers)
+    missing = [ticker for ticker, history in stock_histories.items() if history is None or history.is_empty()]
+    if missing:
+        logger.warning(f"No stock histories found for {len(missing)} tickers: {', '.join(missing)}")
+    print(f"Fetched {len(stock_histories) - len(missing)} of {len(stock_histories)} stock histories")
+
+
+def metrics(args):
+    from src.portfolio import Portfolio
+    portfolio = Portfolio(make_asset_data(args), args.risk_free_rate, args.start, args.end)
+    portfolio.create_portfolio_from_holdings()
+    print(f"Portfolio Return: {portfolio.estimated_return:.2%}")
+    print(f"Portfolio Risk: {portfolio.estimated_risk:.2%}")
+    print(f"Sharpe Ratio: {portfolio.sharpe_ratio:.2f}")
+
+
+def frontier(args):
+    import numpy as np
+    from src.portfolios import Portfolios
+    portfolios = Portfolios(make_asset_data(args), args.risk_free_rate, args.start, args.end)
+    portfolios.create_portfolio_from_holdings()
+    portfolios.create_random_portfolios(args.portfolios, num_stocks=args.num_stocks, seed=args.seed)
+    best = np.argmax(portfolios.sharpe_ratios)
+    print(f"Best of {len(portfolios)} random portfolios: return {portfolios.returns[best]:.2%}, "
+          f"risk {portfolios.risks[best]:.2%}, Sharpe ratio {portfolios.sharpe_ratios[best]:.2f}")
+    portfolios.plot_efficient_frontier(args.target_return, file_path=args.output, mode=args.mode,
+                                       render=not args.no_plot, export_path=args.export)
+    if not args.no_plot:
+        print(f"Efficient frontier chart saved as '{args.output}'")
+
+
+def search(args):
+    from src.portfolios import Portfolios
+    portfolios = Portfolios(make_asset_data(args), args.risk_free_rate, args.start, args.end)
+    best = portfolios.search_best_portfolios(args.num_stocks, args.top_k, time_budget=args.time_budget,
+                                             max_workers=args.workers, seed=args.seed)
+    for rank, portfolio in enumerate(best, 1):
+        holdings = ', '.join(f"{ticker} {percentage:.1f}%" for ticker, percentage in portfolio.portfolio)
+        print(f"{rank}. Sharpe ratio {portfolio.sharpe_ratio:.2f}, return {portfolio.estimated_return:.2%}, "
+              f"risk {portfolio.estimated_risk:.2%}: {holdings}")
+
+
+def backtest(args):
+    from src.backtester import Backtester
+    from src.portfolio import Portfolio
+    asset_data = make_asset_data(args)
+    portfolio = Portfolio(asset_data, args.risk_free_rate, args.start, args.end)
+    portfolio.create_portfolio_from_holdings()
+    backtester = Backtester(asset_data, start_date=args.start, end_date=args.end)
+    rebalance = None if args.rebalance == 'none' else args.rebalance
+    results = backtester.backtest_portfolio(portfolio, rebalance=rebalance, transaction_cost=args.transaction_cost,
+                                            risk_free_rate=args.risk_free_rate)
+    print(f"Total Return: {results['total_return'][0]:.2%}")
+    print(f"Annual Return: {results['annual_return'][0]:.2%}")
+    print(f"Volatility: {results['volatility'][0]:.2%}")
+    print(f"Sharpe Ratio: {results['sharpe_ratio'][0]:.2f}")
+    print(f"Max Drawdown: {results['max_drawdown'][0]:.2%}")
+    print(f"Rebalances: {results['rebalances'][0]}, Turnover: {results['turnover'][0]:.2f}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Portfolio analysis on cached price history.')
+    parser.add_argument('--holdings', default=DEFAULT_HOLDINGS, help='holdings CSV file')
+    parser.add_argument('--cache-dir', default='cache/prices')
+    parser.add_argument('--provider', default='yfinance',
+                        help="comma-separated providers in failover order: yfinance, alpha_vantage, polygon or stub:<directory>")
+    parser.add_argument('--log-level', default='INFO')
+    parser.add_argument('--metrics-json', help='write stage timings and counters to this file')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = commands.add_parser('fetch', help='download or refresh price history for all holdings')
+    fetch_parser.add_argument('--start', help='defaults to 20 years ago')
+    fetch_parser.add_argument('--end', help='defaults to today')
+    fetch_parser.add_argument('--workers', type=int, default=8)
+    fetch_parser.set_defaults(handler=fetch)
+
+    analysis = argparse.ArgumentParser(add_help=False)
+    analysis.add_argument('--start', default='2020-01-01')
+    analysis.add_argument('--end', default='2023-01-01')
+    analysis.add_argument('--risk-free-rate', type=float, default=0.01)
+    analysis.add_argument('--num-factors', type=int, help='use a k-factor risk model instead of the full covariance')
+
+    metrics_parser = commands.add_parser('metrics', parents=[analysis], help='current portfolio metrics')
+    metrics_parser.set_defaults(handler=metrics)
+
+    frontier_parser = commands.add_parser('frontier', parents=[analysis], help='random portfolio cloud and efficient frontier')
+    frontier_parser.add_argument('--portfolios', type=int, default=10000)
+    frontier_parser.add_argument('--num-stocks', type=int, default=10)
+    frontier_parser.add_argument('--seed', type=int)
+    frontier_parser.add_argument('--target-return', type=float, default=0.08)
+    frontier_parser.add_argument('--output', default='efficient_frontier.png')
+    frontier_parser.add_argument('--mode', choices=['auto', 'scatter', 'density'], default='auto')
+    frontier_parser.add_argument('--export', help='write the risk/return points to this Parquet file')
+    frontier_parser.add_argument('--no-plot', action='store_true')
+    frontier_parser.set_defaults(handler=frontier)
+
+    search_parser = commands.add_parser('search', parents=[analysis], help='search ticker subsets for the best Sharpe ratio')
+    search_parser.add_argument('--num-stocks', type=int, default=10)
+    search_parser.add_argument('--top-k', type=int, default=10)
+    search_parser.add_argument('--time-budget', type=float, default=60.0, help='seconds')
+    search_parser.add_argument('--workers', type=int)
+    search_parser.add_argument('--seed', type=int)
+    search_parser.set_defaults(handler=search)
+
+    backtest_parser = commands.add_parser('backtest', parents=[analysis], help='backtest the current holdings')
+    backtest_parser.add_argument('--rebalance', choices=['none', 'monthly', 'quarterly', 'annually'], default='monthly')
+    backtest_parser.add_argument('--transaction-cost', type=float, default=0.0)
+    backtest_parser.set_defaults(handler=backtest)
+
+    args = parser.parse_args(argv)
+    if not hasattr(args, 'num_factors'):
+        args.num_factors = None
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logger.remove()
+    logger.add(sys.stderr, level=args.log_level.upper())
+    args.handler(args)
+
+    from src.instrumentation import instrumentation
+    logger.info("Stage timings:\n{}", instrumentation.summary())
+    if args.metrics_json:
+        instrumentation.export_json(args.metrics_json)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
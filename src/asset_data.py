@@ -1,9 +1,14 @@
-import polars as pl
-import yfinance as yf
 import os
-import json
+import polars as pl
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date
 from loguru import logger
-import pyarrow
+from src.price_panel import PricePanel
+from src.price_store import PriceStore, date_filter, empty_history, normalize_history, to_date
+from src.providers import YFinanceProvider
+from src.universe import UniverseCache
+from src.instrumentation import instrumentation
 
 '''
 Sample csv file:
@@ -16,10 +21,15 @@ Tesla Inc.,TSLA,75,700.00,750.00,56250.00
 
 '''
 class AssetData:
-    def __init__(self, file_path):
+    def __init__(self, file_path, cache_dir='cache/prices', provider=None, shrinkage=None, num_factors=None):
         self.file_path = file_path
         self.data = self.load_data()
         self.stock_history_cache = {}
+        self.history_coverage = {}
+        self.price_store = PriceStore(cache_dir)
+        self.provider = provider if provider is not None else YFinanceProvider()
+        self.universe_cache = UniverseCache(self, shrinkage=shrinkage, num_factors=num_factors,
+                                            estimator_dir=os.path.join(cache_dir, 'estimators'))
 
     def load_data(self):
         logger.info(f"Loading data from CSV file: {self.file_path}")
@@ -33,83 +43,184 @@ class AssetData:
             "Total value": "total_value"
         }
         df = df.rename(fixed_columns)
-        logger.debug(f"Data loaded with columns: {df.columns}")
+        logger.debug("Data loaded with columns: {}", df.columns)
         return df
 
     def check_cache_memory(self, ticker_symbol):
         if ticker_symbol in self.stock_history_cache:
-            logger.debug(f"Stock history for {ticker_symbol} found in memory")
+            logger.debug("Stock history for {} found in memory", ticker_symbol)
+            instrumentation.count('cache.memory_hit')
             return self.stock_history_cache[ticker_symbol]
         return None
 
     def check_cache_file(self, ticker_symbol):
-        history_cache_file = f'cache/{ticker_symbol}_history_cache.json'
-        if os.path.exists(history_cache_file):
-            logger.debug(f"Cache file found for {ticker_symbol}: {history_cache_file}")
-            with open(history_cache_file, 'r') as f:
-                cached_history = json.load(f)
-                self.stock_history_cache[ticker_symbol] = pl.from_dicts(cached_history)
-            return self.stock_history_cache[ticker_symbol]
-        return None
+        history = self.price_store.read(ticker_symbol)
+        if history is None:
+            instrumentation.count('cache.miss')
+        else:
+            logger.debug("Cache file found for {} in {}", ticker_symbol, self.price_store.root)
+            instrumentation.count('cache.file_hit')
+            self.stock_history_cache[ticker_symbol] = history
+            self.history_coverage[ticker_symbol] = self.price_store.read_coverage(ticker_symbol)
+        return history
 
-    def fetch_from_yfinance(self, ticker_symbol, start_date, end_date):
-        try:
-            logger.debug(f"No cache file found for {ticker_symbol}, fetching from yfinance")
-            stock = yf.Ticker(ticker_symbol)
-            hist = stock.history(start=start_date, end=end_date)
-            
-            # Ensure timestamps are converted correctly
-            hist.index = hist.index.strftime('%Y-%m-%d')
-            hist_df = pl.DataFrame(hist.to_dict())
-            return hist_df
-        except Exception as e:
-            logger.error(f"Failed to fetch stock history for {ticker_symbol}: {e}")
-            return None
-        
-    def cache_stock_history(self, ticker_symbol, hist_df):
+    def fetch_batch(self, tickers, start_date, end_date):
+        with instrumentation.timer('fetch'):
+            histories = self.provider.fetch_batch(tickers, start_date, end_date)
+        instrumentation.count('fetch.tickers', len(tickers))
+        return histories
+
+    def fetch_from_provider(self, ticker_symbol, start_date, end_date):
+        logger.debug("Fetching {} from {} for {} to {}", ticker_symbol, self.provider.name, start_date, end_date)
+        return self.fetch_batch([ticker_symbol], start_date, end_date).get(ticker_symbol)
+
+    def cache_stock_history(self, ticker_symbol, hist_df, coverage=None):
         self.stock_history_cache[ticker_symbol] = hist_df
-        history_cache_file = f'{ticker_symbol}_history_cache.json'
+        if coverage is not None:
+            self.history_coverage[ticker_symbol] = coverage
         try:
-            # Convert DataFrame to dict before dumping to JSON
-            hist_dict = hist_df.to_pandas().to_dict(orient='list')
-            with open(history_cache_file, 'w') as f:
-                json.dump(hist_dict, f)
-            logger.debug(f"Stock history for {ticker_symbol} cached to {history_cache_file}")
+            with instrumentation.timer('cache.write'):
+                self.price_store.write(ticker_symbol, hist_df, coverage)
         except Exception as e:
             logger.error(f"Failed to cache stock history for {ticker_symbol}: {e}")
 
+    def missing_segments(self, ticker_symbol, start_date, end_date):
+        # Half-open [start, end) windows not yet covered by the cache. Bars for today are
+        # still forming, so coverage never extends past the current date.
+        start_date = to_date(start_date)
+        end_date = min(to_date(end_date), date.today())
+        if start_date >= end_date:
+            return []
+        coverage = self.history_coverage.get(ticker_symbol)
+        if coverage is None:
+            return [(start_date, end_date)]
+        # Gaps are always filled up to the covered window, so coverage stays one contiguous range
+        covered_start, covered_end = coverage
+        segments = []
+        if start_date < covered_start:
+            segments.append((start_date, covered_start))
+        if end_date > covered_end:
+            segments.append((covered_end, end_date))
+        return segments
+
+    def merge_stock_history(self, ticker_symbol, fetched):
+        # fetched: list of ((segment_start, segment_end), hist_df) for segments that downloaded.
+        # Failed requests never get here (fetch_batch leaves them out), so an empty frame means
+        # the ticker has no bars in that window, e.g. before it listed, and the window counts
+        # as covered rather than being requested again on every call.
+        if not fetched:
+            return
+        history = self.stock_history_cache.get(ticker_symbol)
+        frames = [history if history is not None else empty_history()]
+        frames += [normalize_history(hist_df) for _, hist_df in fetched]
+        merged = normalize_history(pl.concat(frames))
+        bounds = [segment for segment, _ in fetched]
+        if self.history_coverage.get(ticker_symbol) is not None:
+            bounds.append(self.history_coverage[ticker_symbol])
+        coverage = (min(start for start, _ in bounds), max(end for _, end in bounds))
+        self.cache_stock_history(ticker_symbol, merged, coverage)
+        self.universe_cache.clear()
+        logger.debug("Stock history for {} now covers {} to {}", ticker_symbol, coverage[0], coverage[1])
+
     def get_stock_history(self, ticker_symbol, start_date, end_date):
-        logger.info(f"Fetching stock history for {ticker_symbol} from {start_date} to {end_date}")
+        logger.debug("Fetching stock history for {} from {} to {}", ticker_symbol, start_date, end_date)
         
-        # Check if the data is already in memory
+        # Check if the data is already in memory, then the cache file
         history = self.check_cache_memory(ticker_symbol)
-        if history is not None:
-            return history
-        
-        # Check if the cache file exists
-        history = self.check_cache_file(ticker_symbol)
-        if history is not None:
-            return history
+        if history is None:
+            history = self.check_cache_file(ticker_symbol)
         
-        # Fetch stock history from yfinance
-        history = self.fetch_from_yfinance(ticker_symbol, start_date, end_date)
-        if history is not None:
-            self.cache_stock_history(ticker_symbol, history)
+        # Fetch only the leading/trailing segments the cache does not cover yet
+        fetched = []
+        for segment_start, segment_end in self.missing_segments(ticker_symbol, start_date, end_date):
+            hist_df = self.fetch_from_provider(ticker_symbol, segment_start, segment_end)
+            if hist_df is not None:
+                fetched.append(((segment_start, segment_end), hist_df))
+        self.merge_stock_history(ticker_symbol, fetched)
         
-        return history
+        history = self.stock_history_cache.get(ticker_symbol)
+        if history is None:
+            return None
+        return history.filter(date_filter(start_date, end_date))
 
     def get_holdings(self):
         logger.info("Getting holdings from data")
         holdings = []
         for row in self.data.iter_rows(named=True):
             holdings.append((row['stock_name'], row['ticker'], row['shares_owned']))
-        logger.debug(f"Holdings retrieved: {holdings}")
+        logger.opt(lazy=True).debug("Holdings retrieved: {}", lambda: ', '.join(ticker for _, ticker, _ in holdings))
         return holdings
 
-    def fetch_all_stock_histories(self, start_date, end_date):
+    def build_price_panel(self, tickers, start_date, end_date, column='Close', missing='drop'):
+        # Aligns the cached histories on the trading calendar in one pivot. missing='drop' keeps
+        # days every ticker traded, 'ffill' carries prices over gaps, 'mask' leaves NaN.
+        with instrumentation.timer('panel'):
+            self.load_cached_histories(tickers)
+            histories = {}
+            for ticker in tickers:
+                history = self.get_stock_history(ticker, start_date, end_date)
+                if history is None or history.is_empty():
+                    logger.warning("No history data found for stock: {}", ticker)
+                    continue
+                histories[ticker] = history
+            return PricePanel.from_histories(histories, column, missing)
+
+    def get_universe_stats(self, start_date, end_date, tickers=None):
+        if tickers is None:
+            tickers = [ticker for _, ticker, _ in self.get_holdings()]
+        return self.universe_cache.get(start_date, end_date, tickers)
+
+    def load_cached_histories(self, tickers):
+        # One lazy scan over the store instead of opening each ticker's file separately
+        missing = [ticker for ticker in tickers if ticker not in self.stock_history_cache]
+        if missing:
+            with instrumentation.timer('cache.read'):
+                loaded = self.price_store.read_many(missing)
+            self.stock_history_cache.update(loaded)
+            for ticker in loaded:
+                self.history_coverage[ticker] = self.price_store.read_coverage(ticker)
+            instrumentation.count('cache.file_hit', len(loaded))
+            instrumentation.count('cache.miss', len(missing) - len(loaded))
+            logger.debug("Loaded {} of {} stock histories from {}", len(loaded), len(missing), self.price_store.root)
+        return {ticker: self.stock_history_cache[ticker] for ticker in tickers if ticker in self.stock_history_cache}
+
+    def fetch_all_stock_histories(self, start_date, end_date, max_workers=8):
         logger.info("Fetching stock history for all holdings")
+        tickers = [ticker for _, ticker, _ in self.get_holdings()]
+        self.load_cached_histories(tickers)
+
+        # Tickers missing the same segment share one multi-symbol download where supported
+        segment_tickers = defaultdict(list)
+        for ticker in tickers:
+            for segment in self.missing_segments(ticker, start_date, end_date):
+                segment_tickers[segment].append(ticker)
+        batch_size = self.provider.max_batch_size if self.provider.supports_batch else 1
+        batches = [
+            (segment, segment_list[i:i + batch_size])
+            for segment, segment_list in segment_tickers.items()
+            for i in range(0, len(segment_list), batch_size)
+        ]
+        instrumentation.count('fetch.batches', len(batches))
+        logger.debug("Fetching {} batches from {} with {} workers", len(batches), self.provider.name, max_workers)
+
+        fetched = defaultdict(list)
+        if batches:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = {
+                    pool.submit(self.fetch_batch, batch, segment[0], segment[1]): segment
+                    for segment, batch in batches
+                }
+                for future in as_completed(futures):
+                    for ticker, hist_df in future.result().items():
+                        if hist_df is not None:
+                            fetched[ticker].append((futures[future], hist_df))
+        # Merging and persisting stays on this thread, so the store never sees concurrent writes
+        for ticker, segments in fetched.items():
+            self.merge_stock_history(ticker, segments)
+
         stock_histories = {}
-        for _, ticker, _ in self.get_holdings():
-            stock_histories[ticker] = self.get_stock_history(ticker, start_date, end_date)
+        for ticker in tickers:
+            history = self.stock_history_cache.get(ticker)
+            stock_histories[ticker] = history.filter(date_filter(start_date, end_date)) if history is not None else None
         logger.debug("Stock histories fetched for all holdings")
-        return stock_histories
\ No newline at end of file
+        return stock_histories
@@ -1,36 +1,128 @@
-import yfinance as yf
-import polars as pl
 import numpy as np
+from loguru import logger
+from src.covariance import TRADING_DAYS
+from src.instrumentation import instrumentation
+
+REBALANCE_PERIODS = {'monthly': 1, 'quarterly': 3, 'annually': 12}
+
+
 class Backtester:
-    def __init__(self, portfolio):
-        self.portfolio = portfolio
-    def backtest_portfolio(self):
-        stock_symbols = list(self.portfolio.stocks.keys())
-        historical_data = {}
-        # Fetch maximum available historical data for each stock
-        for stock_symbol in stock_symbols:
-            stock = yf.Ticker(stock_symbol)
-            hist = stock.history(period="max")
-            historical_data[stock_symbol] = hist['Close']
-        historical_data_df = pl.DataFrame(historical_data)
-        self.historical_data_df = historical_data_df
-        return historical_data_df
+    # Simulates a batch of target-weight portfolios over an aligned dates x tickers price matrix
+    # taken from the AssetData cache. Equity curves are (num_portfolios, num_days) arrays.
+    def __init__(self, asset_data, start_date='2020-01-01', end_date='2023-01-01', trading_days=TRADING_DAYS):
+        self.asset_data = asset_data
+        self.start_date = start_date
+        self.end_date = end_date
+        self.trading_days = trading_days
+        self.dates = None
+        self.requested_tickers = None
+        self.tickers = None
+        self.prices = None
+        self.results = None
+
+    def load_prices(self, tickers):
+        # Prices are carried forward over gaps, as a held position keeps its last value
+        self.requested_tickers = list(tickers)
+        panel = self.asset_data.build_price_panel(tickers, self.start_date, self.end_date, missing='ffill')
+        self.dates, self.tickers, self.prices = panel.dates, panel.tickers, panel.to_numpy()
+        return self.prices
+
+    def _rebalance_schedule(self, rebalance):
+        # Boolean mask of days on which a scheduled rebalance happens (never day 0)
+        num_days = len(self.dates)
+        schedule = np.zeros(num_days, dtype=bool)
+        if rebalance is None:
+            return schedule
+        if isinstance(rebalance, int):
+            schedule[rebalance::rebalance] = True
+            return schedule
+        months = REBALANCE_PERIODS[rebalance]
+        periods = self.dates.astype('datetime64[M]').astype(np.int64) // months
+        schedule[1:] = periods[1:] != periods[:-1]
+        return schedule
+
+    @instrumentation.timed('backtest')
+    def run(self, weights, tickers, rebalance='monthly', threshold=None, transaction_cost=0.0,
+            initial_value=1.0, risk_free_rate=0.0):
+        # weights: (num_portfolios, num_tickers) target weights over `tickers`.
+        # rebalance: None (buy and hold), a number of trading days, or 'monthly'/'quarterly'/'annually'.
+        # threshold: also rebalance whenever any weight drifts further than this from its target.
+        # transaction_cost: fraction of traded value paid on every rebalance.
+        if self.prices is None or list(tickers) != self.requested_tickers:
+            self.load_prices(tickers)
+        weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+        # Tickers without price history are dropped and the remaining weights renormalized
+        position = {ticker: i for i, ticker in enumerate(tickers)}
+        columns = [position[ticker] for ticker in self.tickers]
+        weights = weights[:, columns]
+        weights /= weights.sum(axis=1, keepdims=True)
+        prices = self.prices
+        num_portfolios, num_days = weights.shape[0], prices.shape[0]
+        logger.info("Backtesting {} portfolios over {} days", num_portfolios, num_days)
+
+        schedule = self._rebalance_schedule(rebalance)
+        candidates = np.arange(1, num_days) if threshold is not None else np.flatnonzero(schedule)
+        units = initial_value * weights / prices[0]
+        equity = np.empty((num_portfolios, num_days))
+        turnover = np.zeros(num_portfolios)
+        rebalances = np.zeros(num_portfolios, dtype=np.int64)
+
+        previous = 0
+        for day in list(candidates) + [num_days]:
+            # Holdings are constant between rebalances, so a whole segment is a single matmul
+            equity[:, previous:day] = units @ prices[previous:day].T
+            if day == num_days:
+                break
+            holdings = units * prices[day]
+            value = holdings.sum(axis=1)
+            drift = np.abs(weights - holdings / value[:, None])
+            mask = np.full(num_portfolios, schedule[day])
+            if threshold is not None:
+                mask |= drift.max(axis=1) > threshold
+            if mask.any():
+                traded = drift[mask].sum(axis=1)
+                value = value[mask] * (1 - transaction_cost * traded)
+                units[mask] = value[:, None] * weights[mask] / prices[day]
+                turnover[mask] += traded
+                rebalances[mask] += 1
+            previous = day
+
+        self.results = self._statistics(equity, risk_free_rate)
+        self.results.update({'equity': equity, 'turnover': turnover, 'rebalances': rebalances})
+        return self.results
+
+    def _statistics(self, equity, risk_free_rate):
+        daily_returns = equity[:, 1:] / equity[:, :-1] - 1
+        total_return = equity[:, -1] / equity[:, 0] - 1
+        years = max(equity.shape[1] - 1, 1) / self.trading_days
+        annual_return = (1 + total_return) ** (1 / years) - 1
+        volatility = daily_returns.std(axis=1, ddof=1) * np.sqrt(self.trading_days)
+        sharpe_ratio = (daily_returns.mean(axis=1) * self.trading_days - risk_free_rate) / volatility
+        drawdown = 1 - equity / np.maximum.accumulate(equity, axis=1)
+        return {
+            'total_return': total_return,
+            'annual_return': annual_return,
+            'volatility': volatility,
+            'sharpe_ratio': sharpe_ratio,
+            'max_drawdown': drawdown.max(axis=1),
+        }
+
+    def backtest_portfolio(self, portfolio, **kwargs):
+        # Backtests a single Portfolio's (ticker, percentage) allocation
+        tickers = [stock for stock, _ in portfolio.portfolio]
+        weights = np.array([percentage for _, percentage in portfolio.portfolio]) / 100
+        return self.run(weights, tickers, **kwargs)
+
     def calculate_performance(self):
-        stock_symbols = list(self.portfolio.stocks.keys())
-        shares = np.array([self.portfolio.stocks[symbol] for symbol in stock_symbols])
-        initial_prices = self.historical_data_df[0]
-        final_prices = self.historical_data_df[-1]
-        initial_value = np.sum(initial_prices * shares)
-        final_value = np.sum(final_prices * shares)
-        performance = (final_value - initial_value) / initial_value
-        return performance
+        if self.results is None:
+            raise ValueError("No backtest results. Call run or backtest_portfolio first.")
+        performance = self.results['total_return']
+        return performance[0] if len(performance) == 1 else performance
 # Example usage:
-# portfolio = Portfolio()
-# portfolio.add_stock('AAPL', 100)
-# portfolio.add_stock('GOOG', 50)
-# portfolio.add_stock('MSFT', 200)
-# portfolio.add_stock('TSLA', 75)
-# backtester = Backtester(portfolio)
-# backtester.backtest_portfolio()
+# asset_data = AssetData('data/sample.csv')
+# portfolio = Portfolio(asset_data)
+# portfolio.create_portfolio_from_holdings()
+# backtester = Backtester(asset_data, start_date='2015-01-01', end_date='2024-01-01')
+# backtester.backtest_portfolio(portfolio, rebalance='quarterly', transaction_cost=0.001)
 # performance = backtester.calculate_performance()
-# print(f'Portfolio performance: {performance:.2%}')
\ No newline at end of file
+# print(f'Portfolio performance: {performance:.2%}')
@@ -0,0 +1,159 @@
+import numpy as np
+
+TRADING_DAYS = 252
+
+'''
+Online covariance estimation. CovarianceEstimator keeps running sums of returns, their
+outer products and (optionally) the fourth-moment sums Ledoit-Wolf shrinkage needs, plus
+an exponentially weighted mean and covariance. Appending a day of returns costs O(N²)
+and never rescans history; the sample sums can also be downdated for sliding windows.
+State round-trips through a single .npz file so a restart resumes without recomputing.
+'''
+class CovarianceEstimator:
+    def __init__(self, num_assets, halflife=None, track_shrinkage=True, tickers=None):
+        self.num_assets = num_assets
+        self.halflife = halflife
+        self.track_shrinkage = track_shrinkage
+        self.tickers = list(tickers) if tickers is not None else None
+        self.last_date = None
+        self.count = 0
+        self.total = np.zeros(num_assets)
+        self.cross = np.zeros((num_assets, num_assets))
+        if track_shrinkage:
+            # quartic[i, j] = Σ x_i² x_j², cubic[i, j] = Σ x_i² x_j
+            self.quartic = np.zeros((num_assets, num_assets))
+            self.cubic = np.zeros((num_assets, num_assets))
+        self.ewma_count = 0
+        self.ewma_mean = np.zeros(num_assets)
+        self.ewma_cov = np.zeros((num_assets, num_assets))
+
+    def _accumulate(self, rows, sign):
+        squares = rows ** 2
+        self.count += sign * rows.shape[0]
+        self.total += sign * rows.sum(axis=0)
+        self.cross += sign * (rows.T @ rows)
+        if self.track_shrinkage:
+            self.quartic += sign * (squares.T @ squares)
+            self.cubic += sign * (squares.T @ rows)
+
+    def update(self, rows, last_date=None):
+        # rows: one day of returns (N,) or a block of days (k, N), oldest first
+        rows = np.atleast_2d(np.asarray(rows, dtype=np.float64))
+        self._accumulate(rows, 1)
+        if self.halflife is not None:
+            alpha = 1 - 0.5 ** (1 / self.halflife)
+            for row in rows:
+                if self.ewma_count == 0:
+                    self.ewma_mean = row.copy()
+                else:
+                    diff = row - self.ewma_mean
+                    increment = alpha * diff
+                    self.ewma_mean += increment
+                    self.ewma_cov = (1 - alpha) * (self.ewma_cov + np.outer(diff, increment))
+                self.ewma_count += 1
+        if last_date is not None:
+            self.last_date = last_date
+        return self
+
+    def downdate(self, rows):
+        # Removes rows previously added to the sample sums; the EWMA state cannot be downdated
+        self._accumulate(np.atleast_2d(np.asarray(rows, dtype=np.float64)), -1)
+        return self
+
+    def mean(self, method='sample'):
+        if method == 'ewma':
+            return self.ewma_mean.copy()
+        return self.total / self.count
+
+    def _empirical_covariance(self):
+        # Biased (divide by T) sample covariance, as used by the Ledoit-Wolf estimator
+        mean = self.mean()
+        return self.cross / self.count - np.outer(mean, mean)
+
+    def ledoit_wolf_shrinkage(self):
+        # Shrinkage intensity towards mu·I from Ledoit & Wolf (2004), using the centered
+        # fourth moments expanded in terms of the raw running sums
+        if not self.track_shrinkage:
+            raise ValueError("Shrinkage requires an estimator created with track_shrinkage=True.")
+        n, p = self.count, self.num_assets
+        m, s1 = self.mean(), self.total
+        s2 = np.diag(self.cross)
+        m2 = m ** 2
+        centered_quartic = (
+            self.quartic
+            - 2 * self.cubic * m[None, :] - 2 * self.cubic.T * m[:, None]
+            + s2[:, None] * m2[None, :] + m2[:, None] * s2[None, :]
+            + 4 * np.outer(m, m) * self.cross
+            - 2 * np.outer(m * s1, m2) - 2 * np.outer(m2, m * s1)
+            + n * np.outer(m2, m2)
+        )
+        emp_cov = self._empirical_covariance()
+        emp_cov_trace = np.trace(emp_cov)
+        mu = emp_cov_trace / p
+        delta_ = np.sum(emp_cov ** 2)
+        beta = (centered_quartic.sum() / n - delta_) / (p * n)
+        delta = (delta_ - 2 * mu * emp_cov_trace + p * mu ** 2) / p
+        beta = min(beta, delta)
+        return 0.0 if beta == 0 else beta / delta
+
+    def covariance(self, shrinkage=None, method='sample'):
+        # method: 'sample' (unbiased) or 'ewma'. shrinkage: None, 'ledoit_wolf' or a fixed
+        # intensity in [0, 1] towards the scaled identity
+        if method == 'ewma':
+            cov = self.ewma_cov.copy()
+        elif shrinkage == 'ledoit_wolf':
+            cov = self._empirical_covariance()
+        else:
+            mean = self.mean()
+            cov = (self.cross - self.count * np.outer(mean, mean)) / (self.count - 1)
+        if shrinkage is None:
+            return cov
+        intensity = self.ledoit_wolf_shrinkage() if shrinkage == 'ledoit_wolf' else float(shrinkage)
+        target = np.trace(cov) / self.num_assets
+        shrunk = (1 - intensity) * cov
+        shrunk.flat[::self.num_assets + 1] += intensity * target
+        return shrunk
+
+    def annualized(self, shrinkage=None, method='sample', trading_days=TRADING_DAYS):
+        return self.mean(method) * trading_days, self.covariance(shrinkage, method) * trading_days
+
+    def save(self, path):
+        state = {
+            'num_assets': self.num_assets,
+            'halflife': np.nan if self.halflife is None else self.halflife,
+            'track_shrinkage': self.track_shrinkage,
+            'tickers': np.array(self.tickers if self.tickers is not None else [], dtype=str),
+            'last_date': np.datetime64('NaT' if self.last_date is None else self.last_date, 'D'),
+            'count': self.count,
+            'total': self.total,
+            'cross': self.cross,
+            'ewma_count': self.ewma_count,
+            'ewma_mean': self.ewma_mean,
+            'ewma_cov': self.ewma_cov,
+        }
+        if self.track_shrinkage:
+            state.update(quartic=self.quartic, cubic=self.cubic)
+        np.savez(path, **state)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as state:
+            halflife = float(state['halflife'])
+            estimator = cls(
+                int(state['num_assets']),
+                halflife=None if np.isnan(halflife) else halflife,
+                track_shrinkage=bool(state['track_shrinkage']),
+                tickers=state['tickers'].tolist() or None,
+            )
+            last_date = state['last_date']
+            estimator.last_date = None if np.isnat(last_date) else last_date
+            estimator.count = int(state['count'])
+            estimator.total = state['total']
+            estimator.cross = state['cross']
+            estimator.ewma_count = int(state['ewma_count'])
+            estimator.ewma_mean = state['ewma_mean']
+            estimator.ewma_cov = state['ewma_cov']
+            if estimator.track_shrinkage:
+                estimator.quartic = state['quartic']
+                estimator.cubic = state['cubic']
+        return estimator
@@ -0,0 +1,91 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+'''
+Stage timers and counters for finding where a run spends its time. Timers record call
+count, total and max wall time per name; counters are plain integers. Recording is a
+lock-protected dict update, cheap enough to leave on in production. The module-level
+`instrumentation` instance is shared by the pipeline; call report() or export_json()
+at the end of a run.
+
+    with instrumentation.timer('covariance'):
+        ...
+
+    @instrumentation.timed('optimize')
+    def calculate_max_sharpe(...):
+        ...
+
+    instrumentation.count('cache.miss')
+'''
+class Instrumentation:
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+
+    def reset(self):
+        with self.lock:
+            self.timings.clear()
+            self.counters.clear()
+
+    def record(self, name, elapsed):
+        with self.lock:
+            timing = self.timings.setdefault(name, [0, 0.0, 0.0])
+            timing[0] += 1
+            timing[1] += elapsed
+            timing[2] = max(timing[2], elapsed)
+
+    @contextmanager
+    def timer(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def timed(self, name):
+        def decorator(function):
+            @wraps(function)
+            def wrapper(*args, **kwargs):
+                with self.timer(name):
+                    return function(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def count(self, name, value=1):
+        if self.enabled:
+            with self.lock:
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self):
+        with self.lock:
+            return {
+                'timers': {
+                    name: {'calls': calls, 'total': total, 'mean': total / calls, 'max': longest}
+                    for name, (calls, total, longest) in sorted(self.timings.items())
+                },
+                'counters': dict(sorted(self.counters.items())),
+            }
+
+    def summary(self):
+        report = self.report()
+        lines = [f"{'stage':24s} {'calls':>8s} {'total s':>10s} {'mean ms':>10s} {'max ms':>10s}"]
+        for name, timing in sorted(report['timers'].items(), key=lambda item: -item[1]['total']):
+            lines.append(f"{name:24s} {timing['calls']:8d} {timing['total']:10.3f} {timing['mean'] * 1000:10.2f} {timing['max'] * 1000:10.2f}")
+        for name, value in report['counters'].items():
+            lines.append(f"{name:24s} {value:8d}")
+        return '\n'.join(lines)
+
+    def export_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+instrumentation = Instrumentation()
@@ -1,61 +1,247 @@
 import numpy as np
-import pandas as pd
-import matplotlib.pyplot as plt
-from scipy.optimize import minimize
+from src.covariance import CovarianceEstimator
+from src.risk_model import DenseRiskModel, FactorRiskModel, as_risk_model
+from src.instrumentation import instrumentation
+
+
+def solve_long_only_qp(cov_matrix, A, b, free=None, max_iter=100, tol=1e-10):
+    # Minimizes w'Σw subject to A w = b and w >= 0 by guessing the set of non-zero weights
+    # and checking the KKT conditions. Passing the free set of a neighbouring solution as
+    # `free` usually converges in one or two linear solves. Returns (weights, free, converged).
+    # cov_matrix may be a dense array or a risk model; only free-set blocks are materialized.
+    risk_model = as_risk_model(cov_matrix)
+    num_assets = risk_model.num_assets
+    free = np.ones(num_assets, dtype=bool) if free is None else free.copy()
+    num_constraints = A.shape[0]
+    weights = np.zeros(num_assets)
+    for _ in range(max_iter):
+        idx = np.flatnonzero(free)
+        A_free = A[:, idx]
+        kkt = np.zeros((len(idx) + num_constraints, len(idx) + num_constraints))
+        kkt[:len(idx), :len(idx)] = risk_model.block(idx)
+        kkt[:len(idx), len(idx):] = -A_free.T
+        kkt[len(idx):, :len(idx)] = A_free
+        rhs = np.concatenate([np.zeros(len(idx)), b])
+        try:
+            solution = np.linalg.solve(kkt, rhs)
+        except np.linalg.LinAlgError:
+            solution = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+        weights = np.zeros(num_assets)
+        weights[idx] = solution[:len(idx)]
+        multipliers = solution[len(idx):]
+
+        negative = weights < -tol
+        if negative.any():
+            free &= ~negative
+            if not free.any():
+                break
+            continue
+        # Zero weights stay optimal only while their reduced gradient is non-negative
+        reduced_gradient = risk_model.matvec(weights) - A.T @ multipliers
+        reduced_gradient[free] = np.inf
+        entering = np.argmin(reduced_gradient)
+        if reduced_gradient[entering] >= -tol * max(1.0, np.abs(reduced_gradient[np.isfinite(reduced_gradient)]).max(initial=0.0)):
+            return np.clip(weights, 0.0, None), free, True
+        free[entering] = True
+    return np.clip(weights, 0.0, None), free, False
+
 
 class Optimizer:
-    def __init__(self, stock_data):
+    # With num_factors set, Σ is a k-factor model (see src.risk_model) and cov_matrix is None
+    def __init__(self, stock_data, shrinkage=None, num_factors=None):
+        import pandas as pd
         self.stock_data = stock_data
         self.returns = self.stock_data.pct_change().dropna()
         self.mean_returns = self.returns.mean()
-        self.cov_matrix = self.returns.cov()
+        if num_factors is not None:
+            self.cov_matrix = None
+            self.risk_model = FactorRiskModel.fit(self.returns.to_numpy(), num_factors)
+        else:
+            estimator = CovarianceEstimator(len(self.returns.columns), track_shrinkage=shrinkage == 'ledoit_wolf')
+            estimator.update(self.returns.to_numpy())
+            self.cov_matrix = pd.DataFrame(estimator.covariance(shrinkage), index=self.returns.columns, columns=self.returns.columns)
+            self.risk_model = DenseRiskModel(self.cov_matrix)
         self.num_stocks = len(self.stock_data.columns)
         self.results = None
+        self.frontier = None
 
-    def calculate_efficient_frontier(self, num_portfolios=10000):
-        results = np.zeros((3, num_portfolios))
-        for i in range(num_portfolios):
-            weights = np.random.random(self.num_stocks)
-            weights /= np.sum(weights)
-            portfolio_return = np.sum(weights * self.mean_returns)
-            portfolio_stddev = np.sqrt(np.dot(weights.T, np.dot(self.cov_matrix, weights)))
-            results[0,i] = portfolio_stddev
-            results[1,i] = portfolio_return
-            results[2,i] = portfolio_return / portfolio_stddev
+    @classmethod
+    def from_moments(cls, mean_returns, cov_matrix):
+        # Builds an optimizer from precomputed moments, skipping the price history.
+        # cov_matrix may be a dense array or a risk model such as a FactorRiskModel.
+        optimizer = cls.__new__(cls)
+        optimizer.stock_data = None
+        optimizer.returns = None
+        optimizer.mean_returns = np.asarray(mean_returns, dtype=np.float64)
+        optimizer.risk_model = as_risk_model(cov_matrix)
+        optimizer.cov_matrix = optimizer.risk_model.cov_matrix if isinstance(optimizer.risk_model, DenseRiskModel) else None
+        optimizer.num_stocks = len(optimizer.mean_returns)
+        optimizer.results = None
+        optimizer.frontier = None
+        return optimizer
+
+    @classmethod
+    def from_estimator(cls, estimator, shrinkage=None, method='sample'):
+        # Reuses a streaming CovarianceEstimator (possibly loaded from disk) without touching history
+        return cls.from_moments(estimator.mean(method), estimator.covariance(shrinkage, method))
+
+    @classmethod
+    def from_panel(cls, panel, num_factors=None):
+        # Daily moments straight from an aligned PricePanel, without a pandas round trip
+        returns = panel.returns()
+        if num_factors is not None:
+            return cls.from_moments(returns.mean(axis=0), FactorRiskModel.fit(returns, num_factors))
+        return cls.from_moments(returns.mean(axis=0), np.cov(returns, rowvar=False))
+
+    def iter_frontier_chunks(self, num_portfolios=10000, chunk_size=10000, seed=None, risk_free_rate=0.0):
+        # Yields (weights, stddevs, returns, sharpe_ratios) for successive chunks of random
+        # portfolios, so callers can stream millions of samples with bounded memory
+        rng = np.random.default_rng(seed)
+        mean_returns = np.asarray(self.mean_returns, dtype=np.float64)
+        for offset in range(0, num_portfolios, chunk_size):
+            size = min(chunk_size, num_portfolios - offset)
+            # Normalized exponential draws are Dirichlet(1, ..., 1): uniform over the simplex
+            weights = rng.standard_exponential((size, self.num_stocks))
+            weights /= weights.sum(axis=1, keepdims=True)
+            portfolio_returns = weights @ mean_returns
+            portfolio_variances = self.risk_model.portfolio_variance(weights)
+            portfolio_stddevs = np.sqrt(portfolio_variances)
+            sharpe_ratios = (portfolio_returns - risk_free_rate) / portfolio_stddevs
+            yield weights, portfolio_stddevs, portfolio_returns, sharpe_ratios
+
+    @instrumentation.timed('optimize.random_frontier')
+    def calculate_efficient_frontier(self, num_portfolios=10000, chunk_size=10000, seed=None, risk_free_rate=0.0):
+        results = np.empty((3, num_portfolios))
+        offset = 0
+        for _, stddevs, returns, sharpe_ratios in self.iter_frontier_chunks(num_portfolios, chunk_size, seed, risk_free_rate):
+            size = len(stddevs)
+            results[0, offset:offset + size] = stddevs
+            results[1, offset:offset + size] = returns
+            results[2, offset:offset + size] = sharpe_ratios
+            offset += size
         self.results = results
+        return results
 
     def calculate_portfolio_risk_return(self, weights):
         portfolio_return = np.sum(weights * self.mean_returns)
-        portfolio_stddev = np.sqrt(np.dot(weights.T, np.dot(self.cov_matrix, weights)))
+        portfolio_stddev = np.sqrt(self.risk_model.portfolio_variance(weights))
         return portfolio_stddev, portfolio_return
 
+    @instrumentation.timed('plot')
     def display_efficient_frontier(self):
         if self.results is None:
             raise ValueError("Efficient frontier not calculated. Call calculate_efficient_frontier first.")
+        import matplotlib.pyplot as plt
         plt.scatter(self.results[0,:], self.results[1,:], c=self.results[2,:], cmap='YlGnBu', marker='o')
+        if self.frontier is not None:
+            plt.plot(self.frontier['risks'], self.frontier['returns'], color='black', label='Efficient frontier')
         plt.title('Efficient Frontier')
         plt.xlabel('Risk')
         plt.ylabel('Return')
         plt.colorbar(label='Sharpe ratio')
         plt.show()
 
-    def generate_similar_risk_portfolios(self, target_risk, num_portfolios=10):
+    def generate_similar_risk_portfolios(self, target_risk, num_portfolios=10, seed=None):
+        # Random starting points give a spread of different portfolios that share the target risk
+        from scipy.optimize import minimize
+        rng = np.random.default_rng(seed)
+
+        def risk_gap(weights):
+            return (np.sqrt(self.risk_model.portfolio_variance(weights)) - target_risk) ** 2
+
         portfolios = []
         for i in range(num_portfolios):
-            weights = np.random.random(self.num_stocks)
+            weights = rng.standard_exponential(self.num_stocks)
             weights /= np.sum(weights)
-            result = minimize(self.calculate_portfolio_risk_return, weights, args=(target_risk,), method='SLSQP', bounds=[(0, 1)]*self.num_stocks, constraints={'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
+            result = minimize(risk_gap, weights, method='SLSQP', bounds=[(0, 1)]*self.num_stocks, constraints={'type': 'eq', 'fun': lambda weights: np.sum(weights) - 1})
             if result.success:
                 portfolios.append(result.x)
         return portfolios
 
+    def _solve_qp(self, A, b, free, start):
+        weights, free, converged = solve_long_only_qp(self.risk_model, A, b, free)
+        if converged:
+            return weights, free
+        # Fall back to SLSQP, still warm-started from the neighbouring solution
+        from scipy.optimize import minimize
+        risk_model = self.risk_model
+        result = minimize(
+            risk_model.portfolio_variance, start, jac=lambda w: 2 * risk_model.matvec(w), method='SLSQP',
+            bounds=[(0, None)] * len(start),
+            constraints={'type': 'eq', 'fun': lambda w: A @ w - b, 'jac': lambda w: A},
+        )
+        weights = np.clip(result.x, 0.0, None)
+        return weights, weights > 1e-10
+
+    def _portfolio_summary(self, weights, mean_returns, risk_free_rate):
+        portfolio_return = weights @ mean_returns
+        portfolio_stddev = np.sqrt(self.risk_model.portfolio_variance(weights))
+        return {
+            'weights': weights,
+            'return': portfolio_return,
+            'risk': portfolio_stddev,
+            'sharpe_ratio': (portfolio_return - risk_free_rate) / portfolio_stddev,
+        }
+
+    @instrumentation.timed('optimize.exact_frontier')
+    def calculate_exact_frontier(self, num_points=100, risk_free_rate=0.0):
+        # Traces the long-only mean-variance frontier from the minimum-variance portfolio to
+        # the highest-return asset, warm-starting each target return from its neighbour
+        mean_returns = np.asarray(self.mean_returns, dtype=np.float64)
+        ones = np.ones((1, self.num_stocks))
+
+        min_variance_weights, free = self._solve_qp(ones, np.ones(1), None, np.full(self.num_stocks, 1 / self.num_stocks))
+        min_variance_weights /= min_variance_weights.sum()
+        min_return = min_variance_weights @ mean_returns
+        best_asset = np.argmax(mean_returns)
+        target_returns = np.linspace(min_return, mean_returns[best_asset], num_points)
+
+        A = np.vstack([ones, mean_returns])
+        weights = np.zeros((num_points, self.num_stocks))
+        weights[0] = min_variance_weights
+        for i in range(1, num_points):
+            if target_returns[i] >= mean_returns[best_asset]:
+                weights[i, best_asset] = 1.0
+                continue
+            weights[i], free = self._solve_qp(A, np.array([1.0, target_returns[i]]), free, weights[i - 1])
+
+        portfolio_returns = weights @ mean_returns
+        portfolio_stddevs = np.sqrt(self.risk_model.portfolio_variance(weights))
+        start = weights[np.argmax((portfolio_returns - risk_free_rate) / portfolio_stddevs)]
+        max_sharpe = self.calculate_max_sharpe(risk_free_rate, start)
+        if max_sharpe is None:
+            max_sharpe = self._portfolio_summary(min_variance_weights, mean_returns, risk_free_rate)
+        self.frontier = {
+            'weights': weights,
+            'returns': portfolio_returns,
+            'risks': portfolio_stddevs,
+            'sharpe_ratios': (portfolio_returns - risk_free_rate) / portfolio_stddevs,
+            'min_variance': self._portfolio_summary(min_variance_weights, mean_returns, risk_free_rate),
+            'max_sharpe': max_sharpe,
+        }
+        return self.frontier
+
+    @instrumentation.timed('optimize.max_sharpe')
+    def calculate_max_sharpe(self, risk_free_rate=0.0, start=None):
+        # Minimizes y'Σy subject to (μ - rf)'y = 1, y >= 0, then rescales y to sum to one.
+        # Returns None when no asset beats the risk-free rate.
+        mean_returns = np.asarray(self.mean_returns, dtype=np.float64)
+        excess_returns = mean_returns - risk_free_rate
+        if not (excess_returns > 0).any():
+            return None
+        if start is None or start @ excess_returns <= 0:
+            start = (excess_returns > 0) / (excess_returns > 0).sum()
+        y, _ = self._solve_qp(excess_returns[None, :], np.ones(1), start > 1e-10, start / (start @ excess_returns))
+        return self._portfolio_summary(y / y.sum(), mean_returns, risk_free_rate)
+
 # Example Usage
 if __name__ == "__main__":
+    import pandas as pd
     # Mock data
     dates = pd.date_range('2023-01-01', '2024-01-01')
     stock_data = pd.DataFrame(np.random.randn(len(dates), 4), index=dates, columns=['AAPL', 'GOOGL', 'MSFT', 'AMZN'])
 
-    optimizer = PortfolioOptimizer(stock_data)
+    optimizer = Optimizer(stock_data)
     optimizer.calculate_efficient_frontier()
     optimizer.display_efficient_frontier()
 
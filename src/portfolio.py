@@ -1,5 +1,4 @@
 import numpy as np
-import polars as pl
 from loguru import logger
 from src.asset_data import AssetData
 
@@ -17,88 +16,64 @@ class Portfolio:
         self.estimated_return = None
         self.estimated_risk = None
         self.sharpe_ratio = None
-        logger.info(f"Initialized Portfolio with start_date: {self.start_date}, end_date: {self.end_date}, risk_free_rate: {self.risk_free_rate}")
+        logger.debug("Initialized Portfolio with start_date: {}, end_date: {}, risk_free_rate: {}", self.start_date, self.end_date, self.risk_free_rate)
 
     def create_portfolio(self, stock_positions):
         total_quantity = sum(quantity for _, _, quantity in stock_positions)
         self.portfolio = [(stock, quantity / total_quantity * 100) for _, stock, quantity in stock_positions]
-        logger.info(f"Created portfolio with stocks: {self.portfolio}")
+        logger.opt(lazy=True).debug("Created portfolio with stocks: {}", lambda: self.portfolio)
         self._calculate_portfolio_metrics()
 
     def create_random_portfolio(self, num_stocks=10):
         import random
-        all_stocks = Portfolio.asset_data.data['Ticker symbol'].to_list()
-        selected_stocks = random.sample(all_stocks, num_stocks)
-        stock_positions = [(stock, random.randint(1, 100)) for stock in selected_stocks]
-        logger.info(f"Selected random stocks for portfolio: {selected_stocks}")
+        holdings = Portfolio.asset_data.get_holdings()
+        selected_stocks = random.sample(holdings, min(num_stocks, len(holdings)))
+        stock_positions = [(name, stock, random.randint(1, 100)) for name, stock, _ in selected_stocks]
+        logger.opt(lazy=True).debug("Selected random stocks for portfolio: {}", lambda: [stock for _, stock, _ in stock_positions])
         self.create_portfolio(stock_positions)
 
     def create_portfolio_from_holdings(self):
         holdings = Portfolio.asset_data.get_holdings()
-        stock_positions = [(ticker, shares_owned) for _, ticker, shares_owned in holdings]
-        self.create_portfolio(stock_positions)
+        self.create_portfolio(holdings)
 
     def _normalize_portfolio(self):
         total_percentage = sum(percentage for _, percentage in self.portfolio)
         self.portfolio = [(stock, percentage / total_percentage * 100) for stock, percentage in self.portfolio]
-        logger.debug(f"Normalized portfolio: {self.portfolio}")
+        logger.opt(lazy=True).debug("Normalized portfolio: {}", lambda: self.portfolio)
 
     def _calculate_portfolio_metrics(self):
-        logger.info("Starting portfolio metrics calculation")
-        returns = []
-        weights = []
+        logger.debug("Starting portfolio metrics calculation")
         
         try:
+            # Returns and covariance are computed once per date window for the whole universe
+            stats = Portfolio.asset_data.get_universe_stats(self.start_date, self.end_date)
+            stocks = []
+            weights = []
             for stock, percentage in self.portfolio:
-                logger.debug(f"Processing stock: {stock}, percentage: {percentage}")
-                try:
-                    history = Portfolio.asset_data.get_stock_history(stock, self.start_date, self.end_date)
-                    if history is None or history.empty:
-                        logger.warning(f"No history data found for stock: {stock}")
-                        continue
-                    if 'Close' not in history.columns:
-                        logger.error(f"'Close' column missing in history data for stock: {stock}")
-                        continue
-                    
-                    logger.debug(f"History data for stock {stock}: {history['Close'].head()}")
-                    stock_returns = history['Close'].pct_change().dropna().to_pandas()
-                    if stock_returns.empty:
-                        logger.warning(f"No valid stock returns data for stock: {stock}")
-                        continue
-
-                    logger.debug(f"Stock returns for stock {stock}: {stock_returns.head()}")
-                    
-                    logger.debug("Stock returns calculated")
-                    returns.append(stock_returns)
-                    weights.append(percentage / 100)
-                except Exception as e:
-                    logger.error(f"Error fetching or processing stock history for {stock}: {e}")
-                    raise
-
-            logger.debug("Stock returns and weights calculated")
-
-            returns_df = pl.DataFrame(np.column_stack(returns), columns=[stock for stock, _ in self.portfolio])
-            logger.debug("Returns DataFrame created")
-
-            mean_returns = returns_df.mean(axis=0).to_numpy() * 252
-            cov_matrix = returns_df.cov().to_numpy() * 252
-            logger.debug("Mean returns and covariance matrix calculated")
+                if stock not in stats.index:
+                    logger.warning("No history data found for stock: {}", stock)
+                    continue
+                stocks.append(stock)
+                weights.append(percentage / 100)
 
-            self.estimated_return = np.dot(weights, mean_returns)
-            portfolio_variance = np.dot(weights, np.dot(cov_matrix, weights))
+            # Moments over every day the held tickers share, not only days the whole universe traded
+            mean_returns, risk_model = stats.held_moments(stats.indices(stocks))
+            weights = np.array(weights)
+            self.estimated_return = weights @ mean_returns
+            portfolio_variance = risk_model.portfolio_variance(weights)
             self.estimated_risk = np.sqrt(portfolio_variance)
             self.sharpe_ratio = (self.estimated_return - self.risk_free_rate) / self.estimated_risk
-            logger.info(f"Calculated portfolio metrics: return={self.estimated_return}, risk={self.estimated_risk}, sharpe_ratio={self.sharpe_ratio}")
+            logger.debug("Calculated portfolio metrics: return={}, risk={}, sharpe_ratio={}", self.estimated_return, self.estimated_risk, self.sharpe_ratio)
         
         except Exception as e:
             logger.error(f"Error in calculating portfolio metrics: {e}")
             raise
     def calculate_portfolio_risk_return(self):
-        logger.info(f"Calculated portfolio risk and return: return={self.estimated_return}, risk={self.estimated_risk}")
+        logger.debug("Calculated portfolio risk and return: return={}, risk={}", self.estimated_return, self.estimated_risk)
         return self.estimated_return, self.estimated_risk
 
     def calculate_portfolio_sharpe_ratio(self):
-        logger.info(f"Calculated portfolio Sharpe ratio: {self.sharpe_ratio}")
+        logger.debug("Calculated portfolio Sharpe ratio: {}", self.sharpe_ratio)
         return self.sharpe_ratio
     
     def display_portfolio_metrics(self, portfolio_value=None):
@@ -1,52 +1,224 @@
 import numpy as np
-import matplotlib.pyplot as plt
+import polars as pl
 from src.portfolio import Portfolio
+from src.instrumentation import instrumentation
+
+MAX_CHUNK_ELEMENTS = 1 << 23
+
 
 class Portfolios:
-    def __init__(self, asset_data):
+    # Candidate portfolios hold only a few tickers each, so they are stored sparsely: a
+    # (num_portfolios, k) matrix of ticker indices into the universe and the matching weights,
+    # with return, risk and Sharpe ratio kept as parallel arrays. Unused slots have weight 0.
+    def __init__(self, asset_data, risk_free_rate=0.01, start_date='2020-01-01', end_date='2023-01-01'):
         self.asset_data = asset_data
-        self.portfolios = None
+        self.risk_free_rate = risk_free_rate
+        self.start_date = start_date
+        self.end_date = end_date
+        self.tickers = []
+        self.indices = None
+        self.weights = None
+        self.returns = None
+        self.risks = None
+        self.sharpe_ratios = None
         self.current_portfolio = None
         self.best_portfolios_by_return = []
 
-    def create_random_portfolios(self, num_portfolios):
-        self.portfolios = [Portfolio(self.asset_data) for _ in range(num_portfolios)]
-        for portfolio in self.portfolios:
-            portfolio.create_random_portfolio()
+    def __len__(self):
+        return 0 if self.weights is None else self.weights.shape[0]
+
+    def universe_stats(self):
+        return self.asset_data.get_universe_stats(self.start_date, self.end_date)
+
+    def evaluate_weights(self, indices, weights):
+        # Batch metrics for (num_portfolios, k) ticker indices and weights; each row only
+        # touches its own k x k block of the covariance
+        stats = self.universe_stats()
+        weights = np.asarray(weights, dtype=np.float64)
+        returns = (weights * stats.mean_returns[indices]).sum(axis=1)
+        risks = np.sqrt(stats.portfolio_variances(indices, weights))
+        sharpe_ratios = (returns - self.risk_free_rate) / risks
+        return returns, risks, sharpe_ratios
+
+    def _reset(self, tickers, num_portfolios=0, num_stocks=0):
+        self.tickers = list(tickers)
+        self.indices = np.zeros((num_portfolios, num_stocks), dtype=np.int32)
+        self.weights = np.zeros((num_portfolios, num_stocks), dtype=np.float32)
+        self.returns = np.empty(num_portfolios)
+        self.risks = np.empty(num_portfolios)
+        self.sharpe_ratios = np.empty(num_portfolios)
+
+    def _pad(self, values, width):
+        return np.pad(values, ((0, 0), (0, width - values.shape[1])))
+
+    def add_portfolios(self, indices, weights):
+        stats = self.universe_stats()
+        if self.weights is None or self.tickers != stats.tickers:
+            self._reset(stats.tickers)
+        indices = np.asarray(indices, dtype=np.int32)
+        weights = np.asarray(weights, dtype=np.float32)
+        returns, risks, sharpe_ratios = self.evaluate_weights(indices, weights)
+        width = max(self.weights.shape[1], weights.shape[1])
+        self.indices = np.vstack([self._pad(self.indices, width), self._pad(indices, width)])
+        self.weights = np.vstack([self._pad(self.weights, width), self._pad(weights, width)])
+        self.returns = np.concatenate([self.returns, returns])
+        self.risks = np.concatenate([self.risks, risks])
+        self.sharpe_ratios = np.concatenate([self.sharpe_ratios, sharpe_ratios])
+
+    @instrumentation.timed('portfolios.random')
+    def create_random_portfolios(self, num_portfolios, num_stocks=10, seed=None, chunk_size=100000):
+        rng = np.random.default_rng(seed)
+        tickers = self.universe_stats().tickers
+        num_tickers = len(tickers)
+        num_stocks = min(num_stocks, num_tickers)
+        self._reset(tickers, num_portfolios, num_stocks)
+        # Sampling draws a (rows, num_tickers) matrix, so large universes get shorter chunks
+        chunk_size = max(1, min(chunk_size, MAX_CHUNK_ELEMENTS // max(num_tickers, 1)))
+        for offset in range(0, num_portfolios, chunk_size):
+            size = min(chunk_size, num_portfolios - offset)
+            rows = slice(offset, offset + size)
+            # A random subset of num_stocks tickers per row, with random 1-100 share weights
+            selected = np.argpartition(rng.random((size, num_tickers)), num_stocks - 1, axis=1)[:, :num_stocks]
+            quantities = rng.integers(1, 101, (size, num_stocks)).astype(np.float64)
+            weights = quantities / quantities.sum(axis=1, keepdims=True)
+            self.indices[rows] = selected
+            self.weights[rows] = weights
+            self.returns[rows], self.risks[rows], self.sharpe_ratios[rows] = self.evaluate_weights(selected, weights)
+
+    def search_best_portfolios(self, num_stocks=10, top_k=10, time_budget=60.0, max_workers=None, seed=None, **kwargs):
+        # Searches ticker subsets for the highest Sharpe ratio instead of sampling at random;
+        # the top_k results are appended to the stored portfolios and returned
+        from src.subset_search import SubsetSearch
+        stats = self.universe_stats()
+        search = SubsetSearch.from_universe(stats, self.risk_free_rate, max_workers)
+        results = search.search(num_stocks, top_k, time_budget=time_budget, seed=seed, **kwargs)
+        width = max((len(result['indices']) for result in results), default=0)
+        indices = np.zeros((len(results), width), dtype=np.int32)
+        weights = np.zeros((len(results), width))
+        for i, result in enumerate(results):
+            indices[i, :len(result['indices'])] = result['indices']
+            weights[i, :len(result['weights'])] = result['weights']
+        first = len(self)
+        self.add_portfolios(indices, weights)
+        return [self.get_portfolio(i) for i in range(first, len(self))]
+
+    def get_portfolio(self, i):
+        portfolio = Portfolio(self.asset_data, self.risk_free_rate, self.start_date, self.end_date)
+        held = np.flatnonzero(self.weights[i])
+        portfolio.portfolio = [(self.tickers[self.indices[i, j]], float(self.weights[i, j]) * 100) for j in held]
+        portfolio.estimated_return = self.returns[i]
+        portfolio.estimated_risk = self.risks[i]
+        portfolio.sharpe_ratio = self.sharpe_ratios[i]
+        return portfolio
+
+    @property
+    def portfolios(self):
+        # Materializes Portfolio objects; meant for small sets, use the arrays for large ones
+        return [self.get_portfolio(i) for i in range(len(self))]
 
     def create_portfolio_from_holdings(self):
         holdings = self.asset_data.get_holdings()
-        self.current_portfolio = Portfolio(self.asset_data)
+        self.current_portfolio = Portfolio(self.asset_data, self.risk_free_rate, self.start_date, self.end_date)
         self.current_portfolio.create_portfolio(holdings)
         return self.current_portfolio
 
+    def _smallest(self, values, candidates, num_portfolios):
+        # Indices into `candidates` of the k smallest values, in ascending order
+        if len(candidates) > num_portfolios:
+            part = np.argpartition(values[candidates], num_portfolios - 1)[:num_portfolios]
+            candidates = candidates[part]
+        return candidates[np.argsort(values[candidates], kind='stable')]
+
     def get_best_portfolios_by_risk(self, target_risk, num_portfolios):
-        return sorted(
-            self.portfolios, key=lambda p: abs(p.estimated_risk - target_risk)
-        )[:num_portfolios]
+        distance = np.abs(self.risks - target_risk)
+        best = self._smallest(distance, np.arange(len(self)), num_portfolios)
+        return [self.get_portfolio(i) for i in best]
 
-    def get_best_portfolios_by_return(self, target_return, num_portfolios):
+    def get_best_portfolios_by_return(self, target_return, num_portfolios, tolerance=0.01):
         # Find portfolios with the desired return and sort them by the lowest risk
-        filtered_portfolios = [p for p in self.portfolios if abs(p.estimated_return - target_return) < 0.01]  # Adjust the threshold as needed
-        self.best_portfolios_by_return = sorted(
-            filtered_portfolios, key=lambda p: p.estimated_risk
-        )[:num_portfolios]
+        candidates = np.flatnonzero(np.abs(self.returns - target_return) < tolerance)
+        best = self._smallest(self.risks, candidates, num_portfolios)
+        self.best_portfolios_by_return = [self.get_portfolio(i) for i in best]
         return self.best_portfolios_by_return
 
-    def plot_efficient_frontier(self, target_return=None, file_path='efficient_frontier.png'):
-        risks = []
-        returns = []
-        for portfolio in self.portfolios:
-            est_return, est_risk = portfolio.calculate_portfolio_risk_return()
-            risks.append(est_risk)
-            returns.append(est_return)
+    def efficient_frontier_points(self):
+        # Pareto staircase of the (risk, return) cloud, not its concave hull: sorted by risk,
+        # keep each portfolio that beats the best return seen at any lower risk, i.e. every
+        # portfolio no other one dominates. O(n log n), no pairwise comparisons.
+        finite = np.flatnonzero(np.isfinite(self.risks) & np.isfinite(self.returns))
+        order = finite[np.argsort(self.risks[finite], kind='stable')]
+        returns = self.returns[order]
+        on_frontier = np.ones(len(returns), dtype=bool)
+        on_frontier[1:] = returns[1:] > np.maximum.accumulate(returns)[:-1]
+        frontier = order[on_frontier]
+        return self.risks[frontier], self.returns[frontier]
+
+    def export_points(self, file_path):
+        pl.DataFrame({'risk': self.risks, 'return': self.returns, 'sharpe_ratio': self.sharpe_ratios}).write_parquet(file_path)
+
+    def _density(self, bins, chunk_size=1000000):
+        # bins x bins histogram of the cloud over (risk, return). Bin indices come straight from
+        # the uniform grid and are accumulated chunk by chunk, so memory stays bounded.
+        # Portfolios with a NaN or infinite risk or return are left out.
+        risk_edges = self._edges(self.risks, bins)
+        return_edges = self._edges(self.returns, bins)
+        counts = np.zeros(bins * bins, dtype=np.int64)
+        for offset in range(0, len(self), chunk_size):
+            risk_bins = self._bin_index(self.risks[offset:offset + chunk_size], risk_edges)
+            return_bins = self._bin_index(self.returns[offset:offset + chunk_size], return_edges)
+            valid = (risk_bins >= 0) & (return_bins >= 0)
+            counts += np.bincount(risk_bins[valid] * bins + return_bins[valid], minlength=bins * bins)
+        return counts.reshape(bins, bins), risk_edges, return_edges
+
+    def _edges(self, values, bins):
+        finite = values[np.isfinite(values)]
+        if not len(finite):
+            return np.linspace(0.0, 1.0, bins + 1)
+        return np.linspace(finite.min(), finite.max(), bins + 1)
+
+    def _bin_index(self, values, edges):
+        # NaN and infinite values map to -1
+        bins = len(edges) - 1
+        width = (edges[-1] - edges[0]) or 1.0
+        scaled = np.nan_to_num((values - edges[0]) * (bins / width), nan=-1.0, posinf=-1.0, neginf=-1.0)
+        return np.minimum(scaled.astype(np.int64), bins - 1)
+
+    @instrumentation.timed('plot')
+    def plot_efficient_frontier(self, target_return=None, file_path='efficient_frontier.png', mode='auto',
+                                max_scatter_points=50000, bins=300, render=True, export_path=None):
+        # mode: 'scatter' draws every portfolio, 'density' a 2D histogram of the cloud;
+        # 'auto' switches to density above max_scatter_points. Rendering is headless (Agg).
+        # export_path writes the point arrays to Parquet; render=False skips the chart.
+        if export_path is not None:
+            self.export_points(export_path)
+        if not render:
+            return
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.colors import LogNorm
+        from matplotlib.figure import Figure
+
+        figure = Figure(figsize=(10, 6))
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        if mode == 'auto':
+            mode = 'density' if len(self) > max_scatter_points else 'scatter'
+        if mode == 'density':
+            counts, risk_edges, return_edges = self._density(bins)
+            image = ax.imshow(
+                np.ma.masked_equal(counts.T, 0), origin='lower', aspect='auto', interpolation='nearest',
+                extent=(risk_edges[0], risk_edges[-1], return_edges[0], return_edges[-1]), norm=LogNorm(), cmap='viridis',
+            )
+            figure.colorbar(image, ax=ax, label='Portfolios')
+        else:
+            points = ax.scatter(self.risks, self.returns, c=self.sharpe_ratios, marker='o', label='Random Portfolios')
+            figure.colorbar(points, ax=ax, label='Sharpe Ratio')
 
-        plt.figure(figsize=(10, 6))
-        plt.scatter(risks, returns, c=(np.array(returns) - self.asset_data.risk_free_rate) / np.array(risks), marker='o', label='Random Portfolios')
+        frontier_risks, frontier_returns = self.efficient_frontier_points()
+        ax.plot(frontier_risks, frontier_returns, color='black', linewidth=1.5, label='Efficient Frontier')
 
         if self.current_portfolio:
-            est_return, est_risk = self.current_portfolio.calculate_portfolio_risk_return()
-            plt.scatter([est_risk], [est_return], color='red', marker='*', s=200, label='Current Portfolio')
+            ax.scatter([self.current_portfolio.estimated_risk], [self.current_portfolio.estimated_return],
+                       color='red', marker='*', s=200, label='Current Portfolio')
 
         # Highlight best portfolios by return if target_return is provided
         if target_return is not None:
@@ -55,19 +227,17 @@ class Portfolios:
         if self.best_portfolios_by_return:
             best_risks = [p.estimated_risk for p in self.best_portfolios_by_return]
             best_returns = [p.estimated_return for p in self.best_portfolios_by_return]
-            plt.scatter(best_risks, best_returns, color='orange', marker='X', s=100, label='Best Portfolios by Return')
+            ax.scatter(best_risks, best_returns, color='orange', marker='X', s=100, label='Best Portfolios by Return')
 
-        plt.xlabel('Risk (Standard Deviation)')
-        plt.ylabel('Return')
-        plt.colorbar(label='Sharpe Ratio')
-        plt.title('Efficient Frontier')
-        plt.legend()
-        plt.savefig(file_path)
-        plt.close()
+        ax.set_xlabel('Risk (Standard Deviation)')
+        ax.set_ylabel('Return')
+        ax.set_title('Efficient Frontier')
+        ax.legend(loc='upper left')
+        figure.savefig(file_path)
 
 # Example usage:
 # asset_data = AssetData('path_to_data_file.csv')
-# portfolios = Portfolios(asset_data, portfolio_count=100)
+# portfolios = Portfolios(asset_data)
 # portfolios.create_random_portfolios(100)
 # portfolios.create_portfolio_from_holdings()
-# portfolios.plot_efficient_frontier(target_return=0.08, file_path='efficient_frontier.png')
\ No newline at end of file
+# portfolios.plot_efficient_frontier(target_return=0.08, file_path='efficient_frontier.png')
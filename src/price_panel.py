@@ -0,0 +1,83 @@
+import numpy as np
+import polars as pl
+from loguru import logger
+from src.price_store import DATE_COLUMN, to_date
+
+MISSING_POLICIES = ('ffill', 'drop', 'mask')
+
+
+class PricePanel:
+    # Aligned dates x tickers float64 price matrix. `values` is a single C-contiguous array
+    # that downstream code reads through views; with the 'mask' policy missing prices are NaN.
+    def __init__(self, dates, tickers, values):
+        self.dates = np.asarray(dates, dtype='datetime64[D]')
+        self.tickers = list(tickers)
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.values = np.ascontiguousarray(values, dtype=np.float64)
+
+    @classmethod
+    def from_histories(cls, histories, column='Close', missing='drop'):
+        # histories: {ticker: frame with Date and `column`}. Every ticker is joined onto the
+        # union of trading days with a sorted-calendar lookup, then the missing-data policy
+        # is applied to the whole matrix at once.
+        if missing not in MISSING_POLICIES:
+            raise ValueError(f"Unknown missing-data policy {missing!r}, expected one of {MISSING_POLICIES}")
+        tickers = [ticker for ticker, history in histories.items() if history is not None and not history.is_empty()]
+        if not tickers:
+            return cls(np.empty(0, dtype='datetime64[D]'), [], np.empty((0, 0)))
+        columns = [histories[ticker].select(DATE_COLUMN, pl.col(column).cast(pl.Float64)) for ticker in tickers]
+        ticker_dates = [frame[DATE_COLUMN].to_numpy() for frame in columns]
+        dates = np.unique(np.concatenate(ticker_dates))
+        values = np.full((len(dates), len(tickers)), np.nan)
+        for j, frame in enumerate(columns):
+            values[np.searchsorted(dates, ticker_dates[j]), j] = frame[column].to_numpy()
+
+        if missing == 'ffill':
+            # Carry prices over gaps, but never before a ticker's first observation
+            valid = ~np.isnan(values)
+            last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(dates))[:, None], 0), axis=0)
+            values = values[last_valid, np.arange(len(tickers))]
+        if missing in ('ffill', 'drop'):
+            complete = ~np.isnan(values).any(axis=1)
+            dropped = len(dates) - int(complete.sum())
+            if dropped:
+                # Usually one late listing truncates the whole panel; name the latest starter
+                first = np.argmax(~np.isnan(values), axis=0)
+                latest = int(np.argmax(first))
+                logger.info("Dropped {} of {} days with missing prices ({} starts {})",
+                            dropped, len(dates), tickers[latest], dates[first[latest]])
+            dates, values = dates[complete], values[complete]
+        return cls(dates, tickers, values)
+
+    def __len__(self):
+        return len(self.dates)
+
+    @property
+    def mask(self):
+        return ~np.isnan(self.values)
+
+    def to_numpy(self):
+        return self.values
+
+    def indices(self, tickers):
+        return np.array([self.index[ticker] for ticker in tickers], dtype=np.intp)
+
+    def dropna(self, columns=None):
+        # Rows where every selected ticker has a price, restricted to those tickers
+        values = self.values if columns is None else self.values[:, columns]
+        tickers = self.tickers if columns is None else [self.tickers[j] for j in columns]
+        complete = ~np.isnan(values).any(axis=1)
+        return PricePanel(self.dates[complete], tickers, values[complete])
+
+    def window(self, start_date=None, end_date=None):
+        # Half-open [start_date, end_date) row slice sharing memory with this panel
+        start = 0 if start_date is None else np.searchsorted(self.dates, np.datetime64(to_date(start_date), 'D'))
+        end = len(self.dates) if end_date is None else np.searchsorted(self.dates, np.datetime64(to_date(end_date), 'D'))
+        return PricePanel(self.dates[start:end], self.tickers, self.values[start:end])
+
+    def returns(self):
+        # Simple daily returns aligned to dates[1:]
+        return self.values[1:] / self.values[:-1] - 1
+
+    def to_frame(self):
+        return pl.DataFrame({DATE_COLUMN: self.dates, **{ticker: self.values[:, i] for i, ticker in enumerate(self.tickers)}})
@@ -0,0 +1,143 @@
+import os
+import json
+import polars as pl
+from datetime import date, datetime, timedelta
+from loguru import logger
+
+'''
+On-disk price history store, one Parquet file per ticker laid out as hive partitions:
+
+cache/prices/ticker=AAPL/data.parquet
+cache/prices/ticker=MSFT/data.parquet
+
+Every file holds a native `Date` column plus the OHLCV columns returned by the data
+provider. Reads go through `pl.scan_parquet`, so date filters are pushed down to the
+row group statistics and ticker filters prune whole partitions.
+
+Next to each data file a small coverage.json records the half-open [start, end) window
+that has already been requested from the provider, so later requests only fetch the
+leading or trailing segments that are missing.
+'''
+DATE_COLUMN = 'Date'
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+PARTITION_COLUMN = 'ticker'
+
+
+def to_date(value):
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+
+def empty_history():
+    return pl.DataFrame(schema={DATE_COLUMN: pl.Date, **{name: pl.Float64 for name in PRICE_COLUMNS}})
+
+
+def normalize_history(hist_df):
+    # Canonical store schema: native Date plus float64 OHLCV, sorted and de-duplicated by date
+    columns = [pl.col(DATE_COLUMN).cast(pl.Date)]
+    columns += [
+        pl.col(name).cast(pl.Float64) if name in hist_df.columns else pl.lit(None, dtype=pl.Float64).alias(name)
+        for name in PRICE_COLUMNS
+    ]
+    return hist_df.select(columns).unique(subset=DATE_COLUMN, keep='last').sort(DATE_COLUMN)
+
+
+def date_filter(start_date=None, end_date=None):
+    # Half-open [start_date, end_date) window, matching the provider's `end` semantics
+    predicate = pl.lit(True)
+    if start_date is not None:
+        predicate = predicate & (pl.col(DATE_COLUMN) >= to_date(start_date))
+    if end_date is not None:
+        predicate = predicate & (pl.col(DATE_COLUMN) < to_date(end_date))
+    return predicate
+
+
+class PriceStore:
+    def __init__(self, root='cache/prices'):
+        self.root = root
+
+    def _partition_dir(self, ticker_symbol):
+        return os.path.join(self.root, f'{PARTITION_COLUMN}={ticker_symbol}')
+
+    def _partition_file(self, ticker_symbol):
+        return os.path.join(self._partition_dir(ticker_symbol), 'data.parquet')
+
+    def _coverage_file(self, ticker_symbol):
+        return os.path.join(self._partition_dir(ticker_symbol), 'coverage.json')
+
+    def has(self, ticker_symbol):
+        return os.path.exists(self._partition_file(ticker_symbol))
+
+    def tickers(self):
+        if not os.path.isdir(self.root):
+            return []
+        prefix = f'{PARTITION_COLUMN}='
+        return sorted(
+            name[len(prefix):] for name in os.listdir(self.root)
+            if name.startswith(prefix) and os.path.exists(os.path.join(self.root, name, 'data.parquet'))
+        )
+
+    def write(self, ticker_symbol, hist_df, coverage=None):
+        os.makedirs(self._partition_dir(ticker_symbol), exist_ok=True)
+        target = self._partition_file(ticker_symbol)
+        tmp = f'{target}.tmp'
+        # Sorted by date so row group min/max statistics make date pushdown effective
+        normalize_history(hist_df).write_parquet(tmp, statistics=True)
+        os.replace(tmp, target)
+        if coverage is not None:
+            self.write_coverage(ticker_symbol, *coverage)
+        logger.debug("Stock history for {} written to {}", ticker_symbol, target)
+
+    def write_coverage(self, ticker_symbol, start_date, end_date):
+        target = self._coverage_file(ticker_symbol)
+        tmp = f'{target}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({'start': to_date(start_date).isoformat(), 'end': to_date(end_date).isoformat()}, f)
+        os.replace(tmp, target)
+
+    def read_coverage(self, ticker_symbol):
+        coverage_file = self._coverage_file(ticker_symbol)
+        if os.path.exists(coverage_file):
+            with open(coverage_file, 'r') as f:
+                coverage = json.load(f)
+            return to_date(coverage['start']), to_date(coverage['end'])
+        if self.has(ticker_symbol):
+            # Files written before coverage tracking: fall back to the dates actually held
+            dates = pl.scan_parquet(self._partition_file(ticker_symbol)).select(
+                pl.col(DATE_COLUMN).min().alias('start'), pl.col(DATE_COLUMN).max().alias('end')
+            ).collect()
+            if dates['start'][0] is not None:
+                return dates['start'][0], dates['end'][0] + timedelta(days=1)
+        return None
+
+    def read(self, ticker_symbol, start_date=None, end_date=None):
+        if not self.has(ticker_symbol):
+            return None
+        return (
+            pl.scan_parquet(self._partition_file(ticker_symbol))
+            .filter(date_filter(start_date, end_date))
+            .collect()
+        )
+
+    def scan(self, tickers=None, start_date=None, end_date=None):
+        # Lazy frame over the whole store with a `ticker` column taken from the partition path
+        if not self.tickers():
+            return None
+        lf = pl.scan_parquet(
+            os.path.join(self.root, f'{PARTITION_COLUMN}=*', 'data.parquet'),
+            hive_partitioning=True,
+            hive_schema={PARTITION_COLUMN: pl.String},
+        )
+        if tickers is not None:
+            lf = lf.filter(pl.col(PARTITION_COLUMN).is_in(list(tickers)))
+        return lf.filter(date_filter(start_date, end_date))
+
+    def read_many(self, tickers, start_date=None, end_date=None):
+        lf = self.scan(tickers, start_date, end_date)
+        if lf is None:
+            return {}
+        frames = lf.collect().partition_by(PARTITION_COLUMN, as_dict=True, include_key=False)
+        return {key[0]: frame.sort(DATE_COLUMN) for key, frame in frames.items()}
@@ -0,0 +1,393 @@
+import os
+import random
+import threading
+import time
+import zlib
+import numpy as np
+import polars as pl
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+from loguru import logger
+from src.price_store import DATE_COLUMN, PRICE_COLUMNS, empty_history, normalize_history, to_date
+
+'''
+Market data providers used by AssetData. Every provider returns histories in the price
+store schema (native Date plus float64 OHLCV) and goes through `fetch_batch`, which
+applies the provider's rate limit, retries and exponential backoff. Providers that can
+download several symbols in one request set `supports_batch` and `max_batch_size`.
+HTTP providers reuse one pooled keep-alive session per provider across threads.
+`adjusted` says whether prices are split and dividend adjusted; histories on different
+bases cannot be mixed in one price store, so failover only chains providers that agree.
+'''
+class PermanentProviderError(Exception):
+    # A failure retrying cannot fix (bad API key, endpoint not in the plan); _call re-raises it at once
+    pass
+
+
+class RateLimiter:
+    # Thread-safe token bucket: at most `rate` calls per `per` seconds, bursting up to `burst`
+    def __init__(self, rate, per=1.0, burst=None):
+        self.rate = rate / per
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class DataProvider:
+    name = 'base'
+    supports_batch = False
+    max_batch_size = 1
+    adjusted = True
+
+    def __init__(self, rate_limit=None, max_retries=3, backoff=0.5, rate_period=1.0):
+        # rate_limit: calls allowed per rate_period seconds
+        self.rate_limiter = RateLimiter(rate_limit, rate_period) if rate_limit else None
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = None
+        self.session_lock = threading.Lock()
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def get_session(self):
+        # One keep-alive connection pool per provider, created on first use
+        with self.session_lock:
+            if self.session is None:
+                self.session = self._new_session()
+            return self.session
+
+    def close(self):
+        with self.session_lock:
+            if self.session is not None:
+                self.session.close()
+                self.session = None
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        raise NotImplementedError
+
+    def fetch_histories(self, tickers, start_date, end_date):
+        return {ticker: self.fetch_history(ticker, start_date, end_date) for ticker in tickers}
+
+    def _call(self, fn, *args):
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return fn(*args)
+            except PermanentProviderError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                logger.warning(f"{self.name} request failed ({e}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+
+    def fetch_batch(self, tickers, start_date, end_date):
+        # Returns {ticker: history}; tickers that still fail after retries are left out
+        if self.supports_batch and len(tickers) > 1:
+            try:
+                return self._call(self.fetch_histories, tickers, start_date, end_date)
+            except Exception as e:
+                logger.error(f"Failed to fetch stock history for {tickers} from {self.name}: {e}")
+                return {}
+        histories = {}
+        for ticker in tickers:
+            try:
+                histories[ticker] = self._call(self.fetch_history, ticker, start_date, end_date)
+            except Exception as e:
+                logger.error(f"Failed to fetch stock history for {ticker} from {self.name}: {e}")
+        return histories
+
+
+def _from_records(records, date_parser=None):
+    # records: {Date: [...], 'Open': [...], ...} as returned by a REST API, in any order
+    if not records or not records.get(DATE_COLUMN):
+        return empty_history()
+    frame = pl.DataFrame(records)
+    if date_parser is not None:
+        frame = frame.with_columns(date_parser(pl.col(DATE_COLUMN)))
+    return normalize_history(frame.select(DATE_COLUMN, *PRICE_COLUMNS))
+
+
+def _from_pandas(hist):
+    if hist is None or hist.empty:
+        return empty_history()
+    hist = hist.reset_index()
+    hist[DATE_COLUMN] = hist[DATE_COLUMN].dt.date
+    return normalize_history(pl.from_pandas(hist))
+
+
+class YFinanceProvider(DataProvider):
+    name = 'yfinance'
+    supports_batch = True
+    max_batch_size = 100
+
+    def __init__(self, rate_limit=5, max_retries=3, backoff=0.5):
+        super().__init__(rate_limit, max_retries, backoff)
+
+    def _new_session(self):
+        # Yahoo needs a browser-impersonating curl_cffi session; yfinance builds its own if unavailable
+        try:
+            from curl_cffi import requests as curl_requests
+        except ImportError:
+            return None
+        return curl_requests.Session(impersonate='chrome')
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        import yfinance as yf
+        stock = yf.Ticker(ticker_symbol, session=self.get_session())
+        return _from_pandas(stock.history(start=start_date, end=end_date, auto_adjust=True))
+
+    def fetch_histories(self, tickers, start_date, end_date):
+        import yfinance as yf
+        data = yf.download(
+            list(tickers), start=start_date, end=end_date, group_by='ticker', auto_adjust=True,
+            threads=False, progress=False, session=self.get_session(),
+        )
+        histories = {}
+        for ticker in tickers:
+            if ticker in data.columns.get_level_values(0):
+                histories[ticker] = _from_pandas(data[ticker].dropna(how='all'))
+        return histories
+
+
+class AlphaVantageProvider(DataProvider):
+    # Daily bars from the Alpha Vantage REST API, one symbol per request. The free tier allows
+    # 5 requests per minute. outputsize=None asks for 'compact' (the latest 100 bars) when the
+    # window starts within that range, so incremental refreshes stay small, and 'full' otherwise.
+    # With adjusted=True OHLC are scaled by adjusted close / close, matching yfinance's
+    # auto_adjust; volume is raw.
+    name = 'alpha_vantage'
+    url = 'https://www.alphavantage.co/query'
+    compact_days = 140  # calendar days safely inside 100 trading days
+
+    def __init__(self, api_key=None, outputsize=None, adjusted=True, rate_limit=5, rate_period=60.0, max_retries=3, backoff=1.0):
+        super().__init__(rate_limit, max_retries, backoff, rate_period)
+        self.api_key = api_key or os.environ.get('ALPHAVANTAGE_API_KEY')
+        self.outputsize = outputsize
+        self.adjusted = adjusted
+
+    def _outputsize(self, start_date):
+        if self.outputsize is not None:
+            return self.outputsize
+        return 'compact' if to_date(start_date) >= date.today() - timedelta(days=self.compact_days) else 'full'
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        response = self.get_session().get(self.url, timeout=30, params={
+            'function': 'TIME_SERIES_DAILY_ADJUSTED' if self.adjusted else 'TIME_SERIES_DAILY', 'symbol': ticker_symbol,
+            'outputsize': self._outputsize(start_date), 'apikey': self.api_key,
+        })
+        response.raise_for_status()
+        payload = response.json()
+        if 'Error Message' in payload:
+            logger.warning(f"{self.name} has no data for {ticker_symbol}: {payload['Error Message']}")
+            return empty_history()
+        if 'Time Series (Daily)' not in payload:
+            # Both come back as 200: 'Note' is throttling and worth a retry, 'Information' means a
+            # bad key or a premium-only endpoint and will not go away
+            if 'Information' in payload:
+                raise PermanentProviderError(payload['Information'])
+            raise ConnectionError(payload.get('Note') or 'unexpected response')
+        series = payload['Time Series (Daily)']
+        start_date, end_date = str(to_date(start_date)), str(to_date(end_date))
+        days = sorted(day for day in series if start_date <= day < end_date)
+        fields = {'Open': '1. open', 'High': '2. high', 'Low': '3. low', 'Close': '4. close'}
+        records = {DATE_COLUMN: days, **{column: [float(series[day][key]) for day in days] for column, key in fields.items()}}
+        records['Volume'] = [float(series[day]['6. volume' if self.adjusted else '5. volume']) for day in days]
+        if self.adjusted:
+            factors = [float(series[day]['5. adjusted close']) / float(series[day]['4. close']) for day in days]
+            for column in fields:
+                records[column] = [value * factor for value, factor in zip(records[column], factors)]
+        return _from_records(records, lambda column: column.str.to_date('%Y-%m-%d'))
+
+
+class PolygonProvider(DataProvider):
+    # Daily aggregates from the Polygon.io REST API, following next_url pagination
+    name = 'polygon'
+    url = 'https://api.polygon.io/v2/aggs/ticker/{ticker}/range/1/day/{start}/{end}'
+
+    def __init__(self, api_key=None, adjusted=True, rate_limit=5, rate_period=60.0, max_retries=3, backoff=1.0):
+        super().__init__(rate_limit, max_retries, backoff, rate_period)
+        self.api_key = api_key or os.environ.get('POLYGON_API_KEY')
+        self.adjusted = adjusted
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        # Polygon's range is inclusive, the store's windows are half-open
+        start_date, last_date = to_date(start_date), to_date(end_date) - timedelta(days=1)
+        if last_date < start_date:
+            return empty_history()
+        session = self.get_session()
+        url = self.url.format(ticker=ticker_symbol, start=start_date, end=last_date)
+        params = {'adjusted': str(self.adjusted).lower(), 'sort': 'asc', 'limit': 50000, 'apiKey': self.api_key}
+        bars = []
+        while url:
+            response = session.get(url, params=params, timeout=30)
+            response.raise_for_status()
+            payload = response.json()
+            bars.extend(payload.get('results') or [])
+            url = payload.get('next_url')
+            params = {'apiKey': self.api_key}
+        records = {
+            DATE_COLUMN: [datetime.fromtimestamp(bar['t'] / 1000, tz=timezone.utc).date() for bar in bars],
+            **{column: [bar[key] for bar in bars] for column, key in zip(PRICE_COLUMNS, 'ohlcv')},
+        }
+        return _from_records(records)
+
+
+class StubProvider(DataProvider):
+    # Offline provider serving histories from local files: <root>/<TICKER>.parquet or .csv with
+    # a Date column and OHLCV. Useful for tests and for replaying recorded data.
+    name = 'stub'
+    supports_batch = True
+    max_batch_size = 1000
+
+    def __init__(self, root, adjusted=True):
+        super().__init__()
+        self.root = Path(root)
+        self.adjusted = adjusted
+
+    def _load(self, ticker_symbol):
+        parquet, csv = self.root / f'{ticker_symbol}.parquet', self.root / f'{ticker_symbol}.csv'
+        if parquet.exists():
+            return pl.read_parquet(parquet)
+        if csv.exists():
+            return pl.read_csv(csv, try_parse_dates=True)
+        return None
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        history = self._load(ticker_symbol)
+        if history is None:
+            return empty_history()
+        history = normalize_history(history.select(DATE_COLUMN, *PRICE_COLUMNS))
+        return history.filter((pl.col(DATE_COLUMN) >= to_date(start_date)) & (pl.col(DATE_COLUMN) < to_date(end_date)))
+
+
+class FailoverProvider(DataProvider):
+    # Tries providers in order; tickers a provider fails on or returns no rows for are asked
+    # of the next one. Each provider keeps its own rate limit, retries and session. Providers
+    # that cannot batch get the remaining tickers in one fetch_batch call, which catches
+    # failures per ticker, so one bad symbol does not send the whole list to the next provider.
+    name = 'failover'
+
+    def __init__(self, providers):
+        super().__init__(max_retries=0)
+        self.providers = list(providers)
+        if len({provider.adjusted for provider in self.providers}) > 1:
+            bases = ', '.join(f"{provider.name} ({'adjusted' if provider.adjusted else 'unadjusted'})" for provider in self.providers)
+            raise ValueError(f"Cannot fail over between providers with different price adjustment: {bases}")
+        self.adjusted = self.providers[0].adjusted
+        self.supports_batch = any(provider.supports_batch for provider in self.providers)
+        self.max_batch_size = max(provider.max_batch_size for provider in self.providers)
+
+    def fetch_batch(self, tickers, start_date, end_date):
+        histories = {}
+        remaining = list(tickers)
+        for provider in self.providers:
+            if not remaining:
+                break
+            size = provider.max_batch_size if provider.supports_batch else len(remaining)
+            for i in range(0, len(remaining), size):
+                histories.update(provider.fetch_batch(remaining[i:i + size], start_date, end_date))
+            remaining = [ticker for ticker in remaining if histories.get(ticker) is None or histories[ticker].is_empty()]
+            if remaining and provider is not self.providers[-1]:
+                logger.info(f"{len(remaining)} tickers not served by {provider.name}, trying the next provider")
+        return histories
+
+    def close(self):
+        for provider in self.providers:
+            provider.close()
+
+
+PROVIDERS = {
+    'yfinance': YFinanceProvider,
+    'alpha_vantage': AlphaVantageProvider,
+    'polygon': PolygonProvider,
+}
+
+
+def create_provider(spec):
+    # spec: comma-separated provider names in failover order, e.g. 'yfinance,polygon'.
+    # 'stub:<directory>' serves local files.
+    providers = []
+    for name in spec.split(','):
+        name = name.strip()
+        if name.startswith('stub:'):
+            providers.append(StubProvider(name[len('stub:'):]))
+        elif name in PROVIDERS:
+            providers.append(PROVIDERS[name]())
+        else:
+            raise ValueError(f"Unknown provider {name!r}, expected one of {list(PROVIDERS)} or stub:<directory>")
+    return providers[0] if len(providers) == 1 else FailoverProvider(providers)
+
+
+class FakeProvider(DataProvider):
+    # Offline provider producing deterministic random-walk prices per ticker. `latency`
+    # simulates network round trips so the concurrent fetch path can be exercised locally.
+    name = 'fake'
+
+    def __init__(self, latency=0.0, failure_rate=0.0, supports_batch=True, max_batch_size=50,
+                 rate_limit=None, max_retries=3, backoff=0.0, seed=0):
+        super().__init__(rate_limit, max_retries, backoff)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.supports_batch = supports_batch
+        self.max_batch_size = max_batch_size
+        self.seed = seed
+        self.failures = random.Random(seed)
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _request(self):
+        with self.lock:
+            self.calls += 1
+            failed = self.failures.random() < self.failure_rate
+        time.sleep(self.latency)
+        if failed:
+            raise ConnectionError('simulated provider failure')
+
+    def _history(self, ticker_symbol, start_date, end_date):
+        # Prices are generated over a fixed calendar so overlapping requests agree
+        origin = to_date('2000-01-03')
+        start_date, end_date = to_date(start_date), to_date(end_date)
+        days = (end_date - origin).days
+        if days <= 0 or start_date >= end_date:
+            return empty_history()
+        rng = np.random.default_rng(zlib.crc32(ticker_symbol.encode()) + self.seed)
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.015, days)))
+        dates = pl.date_range(origin, origin + timedelta(days=days - 1), eager=True)
+        frame = pl.DataFrame({DATE_COLUMN: dates, 'Close': close}).with_columns(
+            pl.col('Close').alias('Open'), pl.col('Close').alias('High'), pl.col('Close').alias('Low'),
+            pl.lit(1e6).alias('Volume'),
+        )
+        return normalize_history(frame.filter(
+            (pl.col(DATE_COLUMN) >= start_date) & (pl.col(DATE_COLUMN).dt.weekday() <= 5)
+        ))
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        self._request()
+        return self._history(ticker_symbol, start_date, end_date)
+
+    def fetch_histories(self, tickers, start_date, end_date):
+        self._request()
+        return {ticker: self._history(ticker, start_date, end_date) for ticker in tickers}
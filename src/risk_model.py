@@ -0,0 +1,127 @@
+import numpy as np
+
+'''
+Risk models share one small interface so the optimizer, portfolio metrics and frontier code
+do not need to know how Σ is stored:
+
+    block(idx)                 dense Σ sub-block for the given asset indices
+    matvec(w)                  Σ w
+    portfolio_variance(W)      w'Σw for a weight vector (N,) or every row of (M, N)
+    subset_variances(I, W)     w'Σw for M portfolios of k assets each, given as (M, k) asset
+                               indices and (M, k) weights; only k x k entries per row are read
+    sub_model(idx)             the same model restricted to a subset of assets
+
+DenseRiskModel wraps an N x N matrix. FactorRiskModel stores Σ = B F B' + D with k factors,
+which needs O(N·k) memory and evaluates portfolio variance in O(N·k).
+'''
+class DenseRiskModel:
+    def __init__(self, cov_matrix):
+        self.cov_matrix = np.asarray(cov_matrix, dtype=np.float64)
+        self.num_assets = self.cov_matrix.shape[0]
+
+    def block(self, idx):
+        return self.cov_matrix[np.ix_(idx, idx)]
+
+    def matvec(self, weights):
+        return self.cov_matrix @ weights
+
+    def portfolio_variance(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        if weights.ndim == 1:
+            return weights @ self.cov_matrix @ weights
+        return np.einsum('ij,ij->i', weights @ self.cov_matrix, weights)
+
+    def subset_variances(self, indices, weights):
+        # One column at a time: temporaries stay (M, k) whatever the universe size
+        weights = np.asarray(weights, dtype=np.float64)
+        variances = np.zeros(weights.shape[0])
+        for j in range(weights.shape[1]):
+            variances += weights[:, j] * (self.cov_matrix[indices[:, j, None], indices] * weights).sum(axis=1)
+        return variances
+
+    def sub_model(self, idx):
+        return DenseRiskModel(self.block(idx))
+
+    def to_dense(self):
+        return self.cov_matrix
+
+    @property
+    def nbytes(self):
+        return self.cov_matrix.nbytes
+
+
+class FactorRiskModel:
+    def __init__(self, loadings, factor_variances, specific_variances):
+        self.loadings = np.asarray(loadings, dtype=np.float64)
+        self.factor_variances = np.asarray(factor_variances, dtype=np.float64)
+        self.specific_variances = np.asarray(specific_variances, dtype=np.float64)
+        self.num_assets, self.num_factors = self.loadings.shape
+
+    @classmethod
+    def fit(cls, returns, num_factors=10, trading_days=1):
+        # Statistical factors from a PCA of the demeaned (T, N) returns. The specific variance is
+        # whatever each asset's variance the k factors leave unexplained.
+        returns = np.asarray(returns, dtype=np.float64)
+        num_obs = returns.shape[0]
+        centered = returns - returns.mean(axis=0)
+        num_factors = min(num_factors, *centered.shape)
+        singular_values, components = _top_singular(centered, num_factors)
+        loadings = components.T
+        factor_variances = singular_values ** 2 / (num_obs - 1)
+        total_variances = (centered ** 2).sum(axis=0) / (num_obs - 1)
+        specific_variances = total_variances - (loadings ** 2) @ factor_variances
+        specific_variances = np.maximum(specific_variances, 1e-6 * total_variances.mean())
+        return cls(loadings, factor_variances * trading_days, specific_variances * trading_days)
+
+    def block(self, idx):
+        loadings = self.loadings[idx]
+        block = (loadings * self.factor_variances) @ loadings.T
+        block.flat[::len(idx) + 1] += self.specific_variances[idx]
+        return block
+
+    def matvec(self, weights):
+        return self.loadings @ (self.factor_variances * (self.loadings.T @ weights)) + self.specific_variances * weights
+
+    def portfolio_variance(self, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        exposures = weights @ self.loadings
+        return (exposures ** 2) @ self.factor_variances + (weights ** 2) @ self.specific_variances
+
+    def subset_variances(self, indices, weights):
+        weights = np.asarray(weights, dtype=np.float64)
+        exposures = np.zeros((weights.shape[0], self.num_factors))
+        for j in range(weights.shape[1]):
+            exposures += weights[:, j, None] * self.loadings[indices[:, j]]
+        return (exposures ** 2) @ self.factor_variances + (weights ** 2 * self.specific_variances[indices]).sum(axis=1)
+
+    def sub_model(self, idx):
+        return FactorRiskModel(self.loadings[idx], self.factor_variances, self.specific_variances[idx])
+
+    def to_dense(self):
+        return self.block(np.arange(self.num_assets))
+
+    @property
+    def nbytes(self):
+        return self.loadings.nbytes + self.factor_variances.nbytes + self.specific_variances.nbytes
+
+
+def _top_singular(matrix, k, oversample=10, power_iterations=2, seed=0):
+    # Leading k singular values and right singular vectors through a randomized range finder
+    # (Halko, Martinsson & Tropp 2011): O(T·N·k) instead of the O(T·N·min(T, N)) full SVD.
+    # A fixed seed keeps fits reproducible; small matrices just take the exact SVD.
+    if k + oversample >= min(matrix.shape):
+        _, singular_values, components = np.linalg.svd(matrix, full_matrices=False)
+        return singular_values[:k], components[:k]
+    sketch = np.random.default_rng(seed).standard_normal((matrix.shape[1], k + oversample))
+    basis = np.linalg.qr(matrix @ sketch)[0]
+    for _ in range(power_iterations):
+        basis = np.linalg.qr(matrix.T @ basis)[0]
+        basis = np.linalg.qr(matrix @ basis)[0]
+    _, singular_values, components = np.linalg.svd(basis.T @ matrix, full_matrices=False)
+    return singular_values[:k], components[:k]
+
+
+def as_risk_model(cov_matrix):
+    if isinstance(cov_matrix, (DenseRiskModel, FactorRiskModel)):
+        return cov_matrix
+    return DenseRiskModel(cov_matrix)
@@ -0,0 +1,217 @@
+import os
+import time
+import numpy as np
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from loguru import logger
+from src.instrumentation import instrumentation
+from src.optimizer import solve_long_only_qp
+from src.risk_model import as_risk_model
+
+'''
+Search for the long-only portfolio with the highest Sharpe ratio that holds at most
+`num_assets` tickers. A subset is scored by solving for its tangency weights on the
+matching Σ sub-block: the closed form Σ⁻¹(μ - rf) when it is already long-only, otherwise
+the active-set QP. Each restart builds a subset by (randomized) greedy forward selection
+and improves it with swap moves; restarts run in a process pool until the time budget is
+spent or `patience` restarts in a row fail to beat the best score.
+'''
+_state = {}
+
+
+def _init_worker(mean_returns, risk_model, risk_free_rate):
+    _state.update(mean_returns=mean_returns, risk_model=risk_model, risk_free_rate=risk_free_rate)
+
+
+def score_subset(mean_returns, risk_model, idx, risk_free_rate=0.0):
+    # Returns (sharpe_ratio, weights) of the max-Sharpe long-only portfolio over assets idx
+    idx = np.asarray(idx, dtype=np.intp)
+    excess = mean_returns[idx] - risk_free_rate
+    if not (excess > 0).any():
+        return -np.inf, None
+    cov = risk_model.block(idx)
+    try:
+        y = np.linalg.solve(cov, excess)
+    except np.linalg.LinAlgError:
+        y = np.linalg.lstsq(cov, excess, rcond=None)[0]
+    if not (y > 0).all():
+        y, _, converged = solve_long_only_qp(cov, excess[None, :], np.ones(1))
+        if not converged:
+            y = _solve_slsqp(cov, excess)
+            if y is None:
+                return -np.inf, None
+    if y.sum() <= 0:
+        return -np.inf, None
+    weights = y / y.sum()
+    return (weights @ excess) / np.sqrt(weights @ cov @ weights), weights
+
+
+def _solve_slsqp(cov, excess):
+    # Fallback when the active set does not converge: min y'Σy s.t. excess·y = 1, y >= 0,
+    # started from the single best asset, which is feasible
+    from scipy.optimize import minimize
+    start = np.zeros(len(excess))
+    best = np.argmax(excess)
+    start[best] = 1 / excess[best]
+    result = minimize(
+        lambda y: y @ cov @ y, start, jac=lambda y: 2 * cov @ y, method='SLSQP', bounds=[(0, None)] * len(start),
+        constraints={'type': 'eq', 'fun': lambda y: excess @ y - 1, 'jac': lambda y: excess[None, :]},
+    )
+    if not result.success:
+        logger.debug("SLSQP did not converge on a subset: {}", result.message)
+        return None
+    return np.clip(result.x, 0.0, None)
+
+
+class _Searcher:
+    # One restart: greedy construction followed by first-improvement swap search
+    def __init__(self, mean_returns, risk_model, risk_free_rate, num_assets, deadline, top_k, seed):
+        self.mean_returns = mean_returns
+        self.risk_model = risk_model
+        self.risk_free_rate = risk_free_rate
+        self.num_assets = num_assets
+        self.deadline = deadline
+        self.top_k = top_k
+        self.rng = np.random.default_rng(seed)
+        self.scores = {}
+
+    def score(self, subset):
+        key = frozenset(subset)
+        if key not in self.scores:
+            self.scores[key] = score_subset(self.mean_returns, self.risk_model, sorted(key), self.risk_free_rate)
+        return self.scores[key][0]
+
+    def construct(self, candidates_per_step):
+        # candidates_per_step=1 is plain greedy; larger values pick randomly among the best few
+        num_total = len(self.mean_returns)
+        subset = []
+        while len(subset) < self.num_assets and time.time() < self.deadline:
+            remaining = np.setdiff1d(np.arange(num_total), subset)
+            gains = np.array([self.score(subset + [j]) for j in remaining])
+            if not np.isfinite(gains).any():
+                break
+            best = np.argsort(-gains, kind='stable')[:candidates_per_step]
+            best = best[np.isfinite(gains[best])]
+            subset.append(int(remaining[self.rng.choice(best)]))
+        return subset
+
+    def improve(self, subset):
+        num_total = len(self.mean_returns)
+        current = self.score(subset)
+        improved = True
+        while improved and time.time() < self.deadline:
+            improved = False
+            outside = self.rng.permutation(np.setdiff1d(np.arange(num_total), subset))
+            for position in self.rng.permutation(len(subset)):
+                for candidate in outside:
+                    if time.time() >= self.deadline:
+                        return subset
+                    trial = subset.copy()
+                    trial[position] = int(candidate)
+                    score = self.score(trial)
+                    if score > current + 1e-12:
+                        subset, current, improved = trial, score, True
+                        break
+                if improved:
+                    break
+        return subset
+
+    def run(self, candidates_per_step):
+        subset = self.improve(self.construct(candidates_per_step))
+        # Only full-size subsets compete: the shorter greedy prefixes are never better than
+        # the subsets that extend them
+        ranked = sorted(
+            ((key, result) for key, result in self.scores.items() if len(key) == self.num_assets),
+            key=lambda item: -item[1][0],
+        )
+        best = [(sorted(key), score, weights) for key, (score, weights) in ranked[:self.top_k] if np.isfinite(score)]
+        if subset and frozenset(subset) not in {frozenset(key) for key, _, _ in best}:
+            score, weights = self.scores[frozenset(subset)]
+            best.append((sorted(subset), score, weights))
+        return best, len(self.scores)
+
+
+def _run_restart(num_assets, deadline, top_k, seed, candidates_per_step):
+    searcher = _Searcher(_state['mean_returns'], _state['risk_model'], _state['risk_free_rate'],
+                         num_assets, deadline, top_k, seed)
+    return searcher.run(candidates_per_step)
+
+
+class SubsetSearch:
+    def __init__(self, mean_returns, cov_matrix, tickers=None, risk_free_rate=0.0, max_workers=None):
+        # cov_matrix may be a dense array or a risk model (see src.risk_model)
+        self.mean_returns = np.asarray(mean_returns, dtype=np.float64)
+        self.risk_model = as_risk_model(cov_matrix)
+        self.tickers = list(tickers) if tickers is not None else list(range(len(self.mean_returns)))
+        self.risk_free_rate = risk_free_rate
+        self.max_workers = max_workers or os.cpu_count()
+        self.evaluations = 0
+
+    @classmethod
+    def from_universe(cls, stats, risk_free_rate=0.0, max_workers=None):
+        return cls(stats.mean_returns, stats.risk_model, stats.tickers, risk_free_rate, max_workers)
+
+    @instrumentation.timed('optimize.subset_search')
+    def search(self, num_assets=10, top_k=10, max_restarts=None, time_budget=60.0, patience=4,
+               candidates_per_step=3, seed=None):
+        # Returns up to top_k distinct subsets as dicts sorted by Sharpe ratio, best first.
+        # Restart 0 is plain greedy; the others randomize among the best candidates_per_step.
+        num_assets = min(num_assets, len(self.mean_returns))
+        max_restarts = max_restarts or 4 * self.max_workers
+        deadline = time.time() + time_budget
+        seeds = np.random.SeedSequence(seed).generate_state(max_restarts)
+        found = {}
+        best_score, stale, submitted = -np.inf, 0, 0
+        logger.info(f"Searching {len(self.mean_returns)} tickers for the best {num_assets}-asset portfolio with {self.max_workers} workers")
+
+        with ProcessPoolExecutor(max_workers=self.max_workers, initializer=_init_worker,
+                                 initargs=(self.mean_returns, self.risk_model, self.risk_free_rate)) as pool:
+            def submit():
+                nonlocal submitted
+                candidates = 1 if submitted == 0 else candidates_per_step
+                future = pool.submit(_run_restart, num_assets, deadline, top_k, int(seeds[submitted]), candidates)
+                submitted += 1
+                return future
+
+            pending = {submit() for _ in range(min(self.max_workers, max_restarts))}
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    subsets, evaluations = future.result()
+                    self.evaluations += evaluations
+                    restart_best = max((score for _, score, _ in subsets), default=-np.inf)
+                    if restart_best > best_score + 1e-9:
+                        best_score, stale = restart_best, 0
+                    else:
+                        stale += 1
+                    for idx, score, weights in subsets:
+                        # Subsets that differ only by zero-weight tickers are the same portfolio
+                        held = weights > 1e-10
+                        key = tuple(np.asarray(idx)[held])
+                        if key not in found or score > found[key][0]:
+                            found[key] = (score, weights[held] / weights[held].sum())
+                # Early stop once restarts keep landing on no better optimum
+                if stale < patience and time.time() < deadline:
+                    while len(pending) < self.max_workers and submitted < max_restarts:
+                        pending.add(submit())
+
+        # A portfolio whose held tickers are contained in a better one is a weaker copy of it
+        ranked = []
+        for idx, result in sorted(found.items(), key=lambda item: -item[1][0]):
+            if len(ranked) == top_k:
+                break
+            if not any(set(idx) < set(better) for better, _ in ranked):
+                ranked.append((idx, result))
+        logger.info(f"Subset search ran {submitted} restarts and {self.evaluations} subset evaluations, best Sharpe ratio {best_score:.4f}")
+        return [self._result(np.array(idx), weights) for idx, (_, weights) in ranked]
+
+    def _result(self, idx, weights):
+        portfolio_return = weights @ self.mean_returns[idx]
+        portfolio_risk = np.sqrt(weights @ self.risk_model.block(idx) @ weights)
+        return {
+            'indices': idx,
+            'tickers': [self.tickers[i] for i in idx],
+            'weights': weights,
+            'return': portfolio_return,
+            'risk': portfolio_risk,
+            'sharpe_ratio': (portfolio_return - self.risk_free_rate) / portfolio_risk,
+        }
@@ -0,0 +1,159 @@
+import os
+import hashlib
+import numpy as np
+from collections import OrderedDict
+from loguru import logger
+from src.covariance import TRADING_DAYS, CovarianceEstimator
+from src.risk_model import DenseRiskModel, FactorRiskModel
+from src.instrumentation import instrumentation
+
+
+class UniverseStats:
+    # Annualized mean vector and risk model for every ticker in the universe over one date
+    # window. Portfolio metrics index into sub-blocks instead of re-reading histories.
+    # With num_factors set, Σ is a k-factor model and no N x N matrix is ever built.
+    # The universe moments use days on which every ticker has a price; `panel`, the masked
+    # price panel, lets a few held tickers use all the days they share (held_moments).
+    def __init__(self, tickers, dates, returns, trading_days=TRADING_DAYS, shrinkage=None, num_factors=None,
+                 estimator=None, panel=None):
+        self.tickers = list(tickers)
+        self.index = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.dates = dates
+        self.returns = returns
+        self.panel = panel
+        self.trading_days = trading_days
+        self.shrinkage = shrinkage
+        num_tickers = len(self.tickers)
+        self.estimator = None
+        self.cov_matrix = None
+        if returns.shape[0] <= 1:
+            self.mean_returns = np.full(num_tickers, np.nan)
+            self.cov_matrix = np.full((num_tickers, num_tickers), np.nan)
+            self.risk_model = DenseRiskModel(self.cov_matrix)
+        elif num_factors is not None:
+            with instrumentation.timer('covariance'):
+                self.mean_returns = returns.mean(axis=0) * trading_days
+                self.risk_model = FactorRiskModel.fit(returns, num_factors, trading_days)
+        else:
+            with instrumentation.timer('covariance'):
+                if estimator is None:
+                    estimator = CovarianceEstimator(num_tickers, track_shrinkage=shrinkage == 'ledoit_wolf', tickers=self.tickers)
+                    estimator.update(returns, dates[-1])
+                self.estimator = estimator
+                self.mean_returns, self.cov_matrix = self.estimator.annualized(shrinkage, trading_days=trading_days)
+                self.risk_model = DenseRiskModel(self.cov_matrix)
+
+    def indices(self, tickers):
+        return np.array([self.index[ticker] for ticker in tickers], dtype=np.intp)
+
+    def portfolio_return(self, idx, weights):
+        return weights @ self.mean_returns[idx]
+
+    def portfolio_variance(self, idx, weights):
+        return self.risk_model.sub_model(idx).portfolio_variance(weights)
+
+    def held_moments(self, idx):
+        # (mean_returns, risk_model) for tickers idx over the days all of them have prices.
+        # When no other ticker cost them a day this is just the universe sub-block.
+        if self.panel is None or len(self.dates) <= 1:
+            return self.mean_returns[idx], self.risk_model.sub_model(idx)
+        held = self.panel.dropna(idx)
+        if len(held) == len(self.dates) + 1:
+            return self.mean_returns[idx], self.risk_model.sub_model(idx)
+        returns = held.returns()
+        if returns.shape[0] <= 1:
+            return np.full(len(idx), np.nan), DenseRiskModel(np.full((len(idx), len(idx)), np.nan))
+        estimator = CovarianceEstimator(len(idx), track_shrinkage=self.shrinkage == 'ledoit_wolf').update(returns)
+        mean_returns, cov_matrix = estimator.annualized(self.shrinkage, trading_days=self.trading_days)
+        return mean_returns, DenseRiskModel(cov_matrix)
+
+    def portfolio_variances(self, indices, weights):
+        # Batch w'Σw for portfolios stored as (num_portfolios, k) ticker indices and weights
+        return self.risk_model.subset_variances(indices, weights)
+
+
+class UniverseCache:
+    # LRU cache of UniverseStats keyed by (start_date, end_date, tickers). With estimator_dir
+    # set, one CovarianceEstimator per (tickers, start_date) is persisted there and later
+    # windows only feed it the days after its last_date, including across restarts.
+    def __init__(self, asset_data, max_entries=8, shrinkage=None, num_factors=None, estimator_dir=None):
+        self.asset_data = asset_data
+        self.estimator_dir = estimator_dir
+        self.max_entries = max_entries
+        self.shrinkage = shrinkage
+        self.num_factors = num_factors
+        self.entries = OrderedDict()
+
+    def clear(self):
+        self.entries.clear()
+
+    def get(self, start_date, end_date, tickers):
+        key = (str(start_date), str(end_date), tuple(tickers))
+        if key in self.entries:
+            instrumentation.count('universe.hit')
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        instrumentation.count('universe.miss')
+        stats = self._build(start_date, end_date, tickers)
+        self.entries[key] = stats
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return stats
+
+    def _build(self, start_date, end_date, tickers):
+        logger.info("Building universe returns for {} tickers from {} to {}", len(tickers), start_date, end_date)
+        panel = self.asset_data.build_price_panel(tickers, start_date, end_date, missing='mask')
+        if not panel.tickers:
+            return UniverseStats([], [], np.empty((0, 0)))
+        with instrumentation.timer('returns'):
+            complete = panel.dropna()
+            if len(complete) < len(panel):
+                logger.info("Universe keeps {} of {} days with prices for every ticker", len(complete), len(panel))
+            returns = complete.returns()
+        dates = complete.dates[1:]
+        estimator = None
+        if self.estimator_dir is not None and self.num_factors is None and returns.shape[0] > 1:
+            estimator = self._estimator(panel.tickers, start_date, dates, returns)
+        return UniverseStats(panel.tickers, dates, returns, shrinkage=self.shrinkage, num_factors=self.num_factors,
+                             estimator=estimator, panel=panel)
+
+    def _estimator_path(self, tickers, start_date):
+        track_shrinkage = self.shrinkage == 'ledoit_wolf'
+        key = '\n'.join([str(start_date), str(track_shrinkage), *tickers])
+        return os.path.join(self.estimator_dir, f'{hashlib.sha1(key.encode()).hexdigest()}.npz')
+
+    def _is_prefix(self, estimator, tickers, dates, returns):
+        # The persisted sums must cover a prefix of these returns: same tickers, same row count up
+        # to last_date and matching totals (histories get re-adjusted or back-filled over time)
+        if estimator.tickers != list(tickers) or estimator.last_date is None:
+            return False
+        seen = np.searchsorted(dates, estimator.last_date, side='right')
+        return estimator.count == seen and np.allclose(estimator.total, returns[:seen].sum(axis=0))
+
+    def _estimator(self, tickers, start_date, dates, returns):
+        path = self._estimator_path(tickers, start_date)
+        save = True
+        with instrumentation.timer('covariance'):
+            estimator = CovarianceEstimator.load(path) if os.path.exists(path) else None
+            if estimator is not None and estimator.last_date is not None and estimator.last_date > dates[-1]:
+                # An earlier end date than the persisted window: build this one fresh, keep the file
+                estimator, save = None, False
+            elif estimator is not None and not self._is_prefix(estimator, tickers, dates, returns):
+                logger.debug("Discarding stale covariance estimator {}", path)
+                estimator = None
+            if estimator is None:
+                instrumentation.count('estimator.miss')
+                estimator = CovarianceEstimator(len(tickers), track_shrinkage=self.shrinkage == 'ledoit_wolf', tickers=tickers)
+            else:
+                instrumentation.count('estimator.hit')
+            if estimator.count < len(dates):
+                logger.debug("Updating covariance estimator with {} new days", len(dates) - estimator.count)
+                estimator.update(returns[estimator.count:], dates[-1])
+            else:
+                save = False
+        if save:
+            os.makedirs(self.estimator_dir, exist_ok=True)
+            tmp = path.replace('.npz', '.tmp.npz')
+            estimator.save(tmp)
+            os.replace(tmp, path)
+        return estimator
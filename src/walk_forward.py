@@ -0,0 +1,127 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from loguru import logger
+from src.covariance import TRADING_DAYS, CovarianceEstimator
+from src.optimizer import Optimizer
+from src.instrumentation import instrumentation
+
+
+def _slide(estimator, returns, current, target):
+    # Moves the estimator's sample sums from rows [a, b) to [c, d) by adding the entering rows
+    # and downdating the leaving ones, O(rows·N²), instead of rebuilding from the whole window
+    (a, b), (c, d) = current, target
+    if c >= b or d <= a:
+        estimator.downdate(returns[a:b]).update(returns[c:d])
+        return
+    if c > a:
+        estimator.downdate(returns[a:c])
+    elif c < a:
+        estimator.update(returns[c:a])
+    if d > b:
+        estimator.update(returns[b:d])
+    elif d < b:
+        estimator.downdate(returns[d:b])
+
+
+def _evaluate_windows(returns, windows, risk_free_rate, trading_days, shrinkage):
+    estimator = CovarianceEstimator(returns.shape[1], track_shrinkage=shrinkage == 'ledoit_wolf')
+    current = (0, 0)
+    results = []
+    for train_start, train_end, test_end in windows:
+        _slide(estimator, returns, current, (train_start, train_end))
+        current = (train_start, train_end)
+        optimizer = Optimizer.from_moments(*estimator.annualized(shrinkage, trading_days=trading_days))
+        max_sharpe = optimizer.calculate_max_sharpe(risk_free_rate)
+        weights = max_sharpe['weights'] if max_sharpe is not None else np.full(returns.shape[1], 1 / returns.shape[1])
+        # Rebalanced to the target weights at the start of the test window, then held
+        growth = np.cumprod(1 + returns[train_end:test_end], axis=0) @ weights
+        oos_returns = np.diff(np.concatenate([[1.0], growth])) / np.concatenate([[1.0], growth[:-1]])
+        results.append((weights, oos_returns))
+    return results
+
+
+def _run_windows(shm_name, shape, windows, risk_free_rate, trading_days, shrinkage):
+    # Worker: attaches to the shared returns matrix and walks its contiguous run of windows
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        return _evaluate_windows(np.ndarray(shape, dtype=np.float64, buffer=shm.buf), windows, risk_free_rate, trading_days, shrinkage)
+    finally:
+        shm.close()
+
+
+class WalkForward:
+    # Rolling train/test study: estimate on `train_days` of returns, hold the max-Sharpe
+    # portfolio for the next `test_days`, then step forward by `step_days`
+    def __init__(self, asset_data, tickers=None, start_date='2005-01-01', end_date='2025-01-01',
+                 train_days=3 * TRADING_DAYS, test_days=21, step_days=None, risk_free_rate=0.0,
+                 max_workers=None, trading_days=TRADING_DAYS, shrinkage=None):
+        self.asset_data = asset_data
+        self.tickers = tickers if tickers is not None else [ticker for _, ticker, _ in asset_data.get_holdings()]
+        self.start_date = start_date
+        self.end_date = end_date
+        self.train_days = train_days
+        self.test_days = test_days
+        self.step_days = step_days if step_days is not None else test_days
+        if self.step_days < test_days:
+            # Overlapping test windows would count the same out-of-sample days more than once
+            raise ValueError(f"step_days ({self.step_days}) must be at least test_days ({test_days}).")
+        self.risk_free_rate = risk_free_rate
+        self.max_workers = max_workers or os.cpu_count()
+        self.trading_days = trading_days
+        self.shrinkage = shrinkage
+        self.results = None
+
+    def windows(self, num_rows):
+        # (train_start, train_end, test_end) row offsets into the returns matrix
+        return [
+            (start, start + self.train_days, min(start + self.train_days + self.test_days, num_rows))
+            for start in range(0, num_rows - self.train_days, self.step_days)
+        ]
+
+    @instrumentation.timed('walk_forward')
+    def run(self):
+        panel = self.asset_data.build_price_panel(self.tickers, self.start_date, self.end_date, missing='drop')
+        tickers = panel.tickers
+        returns = panel.returns()
+        dates = panel.dates[1:]
+        windows = self.windows(returns.shape[0])
+        if not windows:
+            raise ValueError(f"Not enough history for a {self.train_days}-day training window.")
+
+        # Contiguous runs of windows per task so each worker can slide its moments incrementally
+        num_tasks = min(len(windows), self.max_workers * 2)
+        tasks = [[tuple(map(int, window)) for window in chunk] for chunk in np.array_split(np.array(windows), num_tasks)]
+        logger.info(f"Running {len(windows)} walk-forward windows as {num_tasks} tasks on {self.max_workers} workers")
+
+        shm = shared_memory.SharedMemory(create=True, size=max(returns.nbytes, 1))
+        try:
+            shared = np.ndarray(returns.shape, dtype=np.float64, buffer=shm.buf)
+            shared[:] = returns
+            with ProcessPoolExecutor(max_workers=self.max_workers) as pool:
+                futures = [
+                    pool.submit(_run_windows, shm.name, returns.shape, task, self.risk_free_rate, self.trading_days, self.shrinkage)
+                    for task in tasks
+                ]
+                window_results = [result for future in futures for result in future.result()]
+            del shared
+        finally:
+            shm.close()
+            shm.unlink()
+
+        weights = np.array([w for w, _ in window_results])
+        oos_returns = np.concatenate([r for _, r in window_results])
+        oos_dates = np.concatenate([dates[train_end:test_end] for _, train_end, test_end in windows])
+        self.results = {
+            'tickers': list(tickers),
+            'windows': [
+                {'train_start': dates[a], 'train_end': dates[b - 1], 'test_start': dates[b], 'test_end': dates[c - 1]}
+                for a, b, c in windows
+            ],
+            'weights': weights,
+            'oos_dates': oos_dates,
+            'oos_returns': oos_returns,
+            'equity': np.cumprod(1 + oos_returns),
+        }
+        return self.results
@@ -0,0 +1,25 @@
+import polars as pl
+import pytest
+from loguru import logger
+
+
+@pytest.fixture(autouse=True)
+def quiet_logs():
+    logger.remove()
+    yield
+
+
+@pytest.fixture
+def holdings_file(tmp_path):
+    def write(tickers):
+        path = tmp_path / 'holdings.csv'
+        pl.DataFrame({
+            'Stock name': [f'Stock {ticker}' for ticker in tickers],
+            'Ticker symbol': list(tickers),
+            'Shares owned': list(range(1, len(tickers) + 1)),
+            'Purchase price': [1.0] * len(tickers),
+            'Current price': [1.0] * len(tickers),
+            'Total value': [1.0] * len(tickers),
+        }).write_csv(path)
+        return path
+    return write
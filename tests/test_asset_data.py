@@ -0,0 +1,112 @@
+from datetime import date
+import polars as pl
+from src.asset_data import AssetData
+from src.price_store import DATE_COLUMN
+from src.providers import FakeProvider, StubProvider
+
+
+def make_asset_data(holdings_file, tmp_path, provider):
+    return AssetData(holdings_file(['AAA']), cache_dir=tmp_path / 'cache', provider=provider)
+
+
+def expected_rows(start_date, end_date):
+    return FakeProvider()._history('AAA', start_date, end_date).filter(pl.col(DATE_COLUMN) < date.fromisoformat(end_date)).height
+
+
+def test_disjoint_leading_request_fills_gap(holdings_file, tmp_path):
+    provider = FakeProvider()
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    asset_data.get_stock_history('AAA', '2020-01-01', '2021-01-01')
+    asset_data.get_stock_history('AAA', '2010-01-01', '2011-01-01')
+    assert asset_data.history_coverage['AAA'] == (date(2010, 1, 1), date(2021, 1, 1))
+
+    calls = provider.calls
+    history = asset_data.get_stock_history('AAA', '2012-01-01', '2013-01-01')
+    assert provider.calls == calls
+    assert history.height == expected_rows('2012-01-01', '2013-01-01') > 0
+
+
+def test_disjoint_trailing_request_fills_gap(holdings_file, tmp_path):
+    provider = FakeProvider()
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    asset_data.get_stock_history('AAA', '2010-01-01', '2011-01-01')
+    asset_data.get_stock_history('AAA', '2020-01-01', '2021-01-01')
+    assert asset_data.history_coverage['AAA'] == (date(2010, 1, 1), date(2021, 1, 1))
+
+    calls = provider.calls
+    history = asset_data.get_stock_history('AAA', '2015-01-01', '2016-01-01')
+    assert provider.calls == calls
+    assert history.height == expected_rows('2015-01-01', '2016-01-01') > 0
+
+
+def test_wider_request_fetches_both_gaps_without_holes(holdings_file, tmp_path):
+    provider = FakeProvider()
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    asset_data.get_stock_history('AAA', '2012-01-01', '2013-01-01')
+    assert asset_data.missing_segments('AAA', '2010-01-01', '2015-01-01') == [
+        (date(2010, 1, 1), date(2012, 1, 1)), (date(2013, 1, 1), date(2015, 1, 1)),
+    ]
+    history = asset_data.get_stock_history('AAA', '2010-01-01', '2015-01-01')
+    assert history.height == expected_rows('2010-01-01', '2015-01-01')
+    assert asset_data.history_coverage['AAA'] == (date(2010, 1, 1), date(2015, 1, 1))
+
+
+def test_coverage_survives_restart(holdings_file, tmp_path):
+    make_asset_data(holdings_file, tmp_path, FakeProvider()).get_stock_history('AAA', '2020-01-01', '2021-01-01')
+    provider = FakeProvider()
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    history = asset_data.get_stock_history('AAA', '2020-03-01', '2020-06-01')
+    assert provider.calls == 0
+    assert history.height == expected_rows('2020-03-01', '2020-06-01')
+
+
+def test_empty_response_counts_as_covered(holdings_file, tmp_path):
+    stub = tmp_path / 'stub'
+    stub.mkdir()
+    provider = StubProvider(stub)
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    assert asset_data.get_stock_history('AAA', '2020-01-01', '2021-01-01').is_empty()
+    assert asset_data.history_coverage['AAA'] == (date(2020, 1, 1), date(2021, 1, 1))
+    assert asset_data.missing_segments('AAA', '2020-01-01', '2021-01-01') == []
+
+
+class CountingStubProvider(StubProvider):
+    def __init__(self, root):
+        super().__init__(root)
+        self.calls = 0
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        self.calls += 1
+        return super().fetch_history(ticker_symbol, start_date, end_date)
+
+
+def test_pre_listing_segment_is_fetched_once(holdings_file, tmp_path):
+    # AAA lists in 2021, so the 2020 segment legitimately has no bars
+    stub = tmp_path / 'stub'
+    stub.mkdir()
+    FakeProvider()._history('AAA', '2021-01-01', '2023-01-01').write_parquet(stub / 'AAA.parquet')
+    provider = CountingStubProvider(stub)
+    asset_data = make_asset_data(holdings_file, tmp_path, provider)
+    asset_data.get_stock_history('AAA', '2021-01-01', '2023-01-01')
+    for _ in range(5):
+        history = asset_data.get_stock_history('AAA', '2020-01-01', '2023-01-01')
+    assert provider.calls == 2
+    assert history[DATE_COLUMN].min() >= date(2021, 1, 1)
+
+    restarted = CountingStubProvider(stub)
+    make_asset_data(holdings_file, tmp_path, restarted).get_stock_history('AAA', '2020-01-01', '2023-01-01')
+    assert restarted.calls == 0
+
+
+def test_failed_fetch_does_not_extend_coverage(holdings_file, tmp_path):
+    asset_data = make_asset_data(holdings_file, tmp_path, FakeProvider(failure_rate=1.0, max_retries=0))
+    assert asset_data.get_stock_history('AAA', '2020-01-01', '2021-01-01') is None
+    assert asset_data.history_coverage.get('AAA') is None
+
+
+def test_fetch_all_fills_disjoint_gap(holdings_file, tmp_path):
+    asset_data = AssetData(holdings_file(['AAA', 'BBB']), cache_dir=tmp_path / 'cache', provider=FakeProvider())
+    asset_data.fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    histories = asset_data.fetch_all_stock_histories('2010-01-01', '2011-01-01')
+    assert all(history.height > 0 for history in histories.values())
+    assert asset_data.get_stock_history('BBB', '2015-01-01', '2016-01-01').height > 0
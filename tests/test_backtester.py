@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from src.backtester import Backtester
+
+
+def make_backtester(prices, tickers=None, start='2020-01-01'):
+    prices = np.asarray(prices, dtype=np.float64)
+    backtester = Backtester(None)
+    backtester.dates = np.datetime64(start, 'D') + np.arange(prices.shape[0])
+    backtester.tickers = tickers or [f'T{j}' for j in range(prices.shape[1])]
+    backtester.requested_tickers = list(backtester.tickers)
+    backtester.prices = prices
+    return backtester
+
+
+def random_prices(num_days=300, num_tickers=4, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, (num_days, num_tickers)), axis=0))
+
+
+def reference_equity(prices, weights, schedule, threshold, transaction_cost):
+    # Steps through every day: rebalance first, then mark the portfolio to market
+    units = weights / prices[0]
+    equity = [units @ prices[0]]
+    for day in range(1, len(prices)):
+        holdings = units * prices[day]
+        value = holdings.sum()
+        drift = np.abs(weights - holdings / value)
+        if schedule[day] or (threshold is not None and drift.max() > threshold):
+            value *= 1 - transaction_cost * drift.sum()
+            units = value * weights / prices[day]
+        equity.append(units @ prices[day])
+    return np.array(equity)
+
+
+@pytest.mark.parametrize('rebalance, threshold', [('monthly', None), ('quarterly', 0.05), (None, 0.03), (20, None)])
+def test_run_matches_daily_loop(rebalance, threshold):
+    prices = random_prices()
+    backtester = make_backtester(prices)
+    weights = np.random.default_rng(1).dirichlet(np.ones(4), 5)
+    results = backtester.run(weights, backtester.tickers, rebalance=rebalance, threshold=threshold, transaction_cost=0.002)
+    schedule = backtester._rebalance_schedule(rebalance)
+    for i, row in enumerate(weights):
+        np.testing.assert_allclose(results['equity'][i], reference_equity(prices, row, schedule, threshold, 0.002))
+
+
+def test_buy_and_hold_never_trades():
+    prices = random_prices()
+    backtester = make_backtester(prices)
+    weights = np.array([0.1, 0.2, 0.3, 0.4])
+    results = backtester.run(weights, backtester.tickers, rebalance=None, transaction_cost=0.01)
+    np.testing.assert_allclose(results['equity'][0], (weights / prices[0]) @ prices.T)
+    assert results['rebalances'][0] == 0
+    assert results['turnover'][0] == 0
+
+
+def test_integer_period_schedule():
+    backtester = make_backtester(random_prices(num_days=50))
+    assert np.flatnonzero(backtester._rebalance_schedule(10)).tolist() == [10, 20, 30, 40]
+    results = backtester.run([0.25] * 4, backtester.tickers, rebalance=10)
+    assert results['rebalances'][0] == 4
+
+
+def test_calendar_schedule_rebalances_on_first_day_of_period():
+    backtester = make_backtester(random_prices(num_days=100), start='2020-01-15')
+    rebalance_days = backtester.dates[backtester._rebalance_schedule('monthly')]
+    assert rebalance_days.astype(str).tolist() == ['2020-02-01', '2020-03-01', '2020-04-01']
+    assert backtester.dates[backtester._rebalance_schedule('quarterly')].astype(str).tolist() == ['2020-04-01']
+
+
+def test_tickers_missing_from_panel_are_dropped_and_renormalized():
+    prices = random_prices(num_tickers=2)
+    backtester = make_backtester(prices, tickers=['A', 'C'])
+    backtester.requested_tickers = ['A', 'B', 'C']
+    results = backtester.run([0.2, 0.5, 0.3], ['A', 'B', 'C'], rebalance=None)
+    expected = (np.array([0.4, 0.6]) / prices[0]) @ prices.T
+    np.testing.assert_allclose(results['equity'][0], expected)
+
+
+def test_statistics_on_known_path():
+    # One asset: 100 -> 120 -> 90 -> 108 -> 60 -> 75
+    prices = np.array([[100.0], [120.0], [90.0], [108.0], [60.0], [75.0]])
+    backtester = make_backtester(prices)
+    results = backtester.run([1.0], backtester.tickers, rebalance=None)
+    assert results['max_drawdown'][0] == pytest.approx(0.5)
+    assert results['total_return'][0] == pytest.approx(-0.25)
+    daily = prices[1:, 0] / prices[:-1, 0] - 1
+    assert results['volatility'][0] == pytest.approx(daily.std(ddof=1) * np.sqrt(252))
+    assert results['sharpe_ratio'][0] == pytest.approx(daily.mean() * 252 / (daily.std(ddof=1) * np.sqrt(252)))
@@ -0,0 +1,91 @@
+import json
+import threading
+import pytest
+from src import instrumentation as instrumentation_module
+from src.instrumentation import Instrumentation
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # perf_counter advances only when the test says so
+    now = [0.0]
+    monkeypatch.setattr(instrumentation_module.time, 'perf_counter', lambda: now[0])
+    return now
+
+
+def test_timer_records_calls_total_and_max(clock):
+    instrumentation = Instrumentation()
+    for elapsed in [0.5, 1.5]:
+        with instrumentation.timer('stage'):
+            clock[0] += elapsed
+    with pytest.raises(ValueError):
+        with instrumentation.timer('stage'):
+            clock[0] += 1.0
+            raise ValueError
+    assert instrumentation.timings['stage'] == [3, 3.0, 1.5]
+
+
+def test_timed_wraps_function(clock):
+    instrumentation = Instrumentation()
+
+    @instrumentation.timed('work')
+    def work(value, offset=0):
+        clock[0] += 0.25
+        return value * 2 + offset
+
+    assert work(3, offset=1) == 7
+    assert work(1) == 2
+    assert work.__name__ == 'work'
+    assert instrumentation.timings['work'] == [2, 0.5, 0.25]
+
+
+def test_count_is_thread_safe():
+    instrumentation = Instrumentation()
+    threads = [threading.Thread(target=lambda: [instrumentation.count('hits') for _ in range(1000)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    instrumentation.count('rows', 5)
+    instrumentation.count('rows', 7)
+    assert instrumentation.counters == {'hits': 8000, 'rows': 12}
+
+
+def test_report_summary_and_export(clock, tmp_path):
+    instrumentation = Instrumentation()
+    for name, elapsed in [('b', 0.2), ('a', 0.1), ('b', 0.4)]:
+        with instrumentation.timer(name):
+            clock[0] += elapsed
+    instrumentation.count('z')
+    instrumentation.count('y', 3)
+    report = instrumentation.report()
+    assert list(report['timers']) == ['a', 'b']
+    assert report['timers']['b'] == pytest.approx({'calls': 2, 'total': 0.6, 'mean': 0.3, 'max': 0.4})
+    assert list(report['counters'].items()) == [('y', 3), ('z', 1)]
+
+    lines = instrumentation.summary().splitlines()
+    assert lines[0].split() == ['stage', 'calls', 'total', 's', 'mean', 'ms', 'max', 'ms']
+    assert [line.split()[0] for line in lines[1:]] == ['b', 'a', 'y', 'z']
+    assert lines[1].split() == ['b', '2', '0.600', '300.00', '400.00']
+
+    path = tmp_path / 'run_metrics.json'
+    instrumentation.export_json(path)
+    assert json.loads(path.read_text()) == json.loads(json.dumps(report))
+
+    instrumentation.reset()
+    assert instrumentation.report() == {'timers': {}, 'counters': {}}
+
+
+def test_disabled_records_nothing(clock):
+    instrumentation = Instrumentation(enabled=False)
+
+    @instrumentation.timed('work')
+    def work():
+        clock[0] += 1.0
+        return 'done'
+
+    with instrumentation.timer('stage'):
+        clock[0] += 1.0
+    assert work() == 'done'
+    instrumentation.count('hits')
+    assert instrumentation.report() == {'timers': {}, 'counters': {}}
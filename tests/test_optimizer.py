@@ -0,0 +1,125 @@
+import numpy as np
+import pytest
+from scipy.optimize import minimize
+from src.optimizer import Optimizer, solve_long_only_qp
+from src.risk_model import DenseRiskModel, FactorRiskModel
+
+
+def random_moments(num_assets, seed):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.01, (500, num_assets)) + rng.normal(0, 0.006, (500, 1))
+    return returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+
+def slsqp(cov, constraints, start):
+    result = minimize(
+        lambda w: w @ cov @ w, start, jac=lambda w: 2 * cov @ w, method='SLSQP',
+        bounds=[(0, None)] * len(start), constraints=constraints, options={'ftol': 1e-14, 'maxiter': 1000},
+    )
+    assert result.success
+    return result.x
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+def test_min_variance_matches_slsqp(seed):
+    _, cov = random_moments(12, seed)
+    ones = np.ones((1, 12))
+    weights, _, converged = solve_long_only_qp(cov, ones, np.ones(1))
+    expected = slsqp(cov, {'type': 'eq', 'fun': lambda w: w.sum() - 1}, np.full(12, 1 / 12))
+    assert converged
+    assert weights.min() >= 0
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights @ cov @ weights == pytest.approx(expected @ cov @ expected, rel=1e-6)
+    np.testing.assert_allclose(weights, expected, atol=1e-4)
+
+
+@pytest.mark.parametrize('quantile', [0.3, 0.6, 0.9])
+def test_target_return_matches_slsqp(quantile):
+    mean_returns, cov = random_moments(12, 3)
+    min_variance, _, _ = solve_long_only_qp(cov, np.ones((1, 12)), np.ones(1))
+    low, high = min_variance @ mean_returns, mean_returns.max()
+    target = low + quantile * (high - low)
+    A = np.vstack([np.ones(12), mean_returns])
+    weights, _, converged = solve_long_only_qp(cov, A, np.array([1.0, target]))
+    expected = slsqp(cov, {'type': 'eq', 'fun': lambda w: A @ w - np.array([1.0, target])}, np.full(12, 1 / 12))
+    assert converged
+    assert weights @ mean_returns == pytest.approx(target)
+    assert weights @ cov @ weights == pytest.approx(expected @ cov @ expected, rel=1e-6)
+
+
+def test_max_sharpe_matches_slsqp():
+    mean_returns, cov = random_moments(12, 4)
+    risk_free_rate = 0.02
+    result = Optimizer.from_moments(mean_returns, cov).calculate_max_sharpe(risk_free_rate)
+
+    def negative_sharpe(w):
+        return -(w @ mean_returns - risk_free_rate) / np.sqrt(w @ cov @ w)
+
+    best = min(
+        (minimize(negative_sharpe, start, method='SLSQP', bounds=[(0, 1)] * 12,
+                  constraints={'type': 'eq', 'fun': lambda w: w.sum() - 1}, options={'ftol': 1e-12})
+         for start in np.random.default_rng(0).dirichlet(np.ones(12), 5)),
+        key=lambda r: r.fun,
+    )
+    assert result['sharpe_ratio'] == pytest.approx(-best.fun, rel=1e-5)
+    assert result['weights'].sum() == pytest.approx(1.0)
+    assert result['weights'].min() >= 0
+
+
+def test_max_sharpe_is_none_when_nothing_beats_risk_free_rate():
+    mean_returns, cov = random_moments(5, 5)
+    assert Optimizer.from_moments(mean_returns, cov).calculate_max_sharpe(mean_returns.max() + 0.01) is None
+
+
+def test_exact_frontier_is_monotone_and_matches_slsqp():
+    mean_returns, cov = random_moments(15, 6)
+    frontier = Optimizer.from_moments(mean_returns, cov).calculate_exact_frontier(num_points=20)
+    assert np.all(np.diff(frontier['returns']) > -1e-12)
+    assert np.all(np.diff(frontier['risks']) > -1e-12)
+    i = 10
+    A = np.vstack([np.ones(15), mean_returns])
+    b = np.array([1.0, frontier['returns'][i]])
+    expected = slsqp(cov, {'type': 'eq', 'fun': lambda w: A @ w - b}, np.full(15, 1 / 15))
+    assert frontier['risks'][i] == pytest.approx(np.sqrt(expected @ cov @ expected), rel=1e-5)
+
+
+def test_singular_kkt_falls_back_to_lstsq(monkeypatch):
+    # Assets 0 and 1 are identical, so the KKT matrix over the full free set is singular
+    cov = np.array([[0.04, 0.04, 0.01], [0.04, 0.04, 0.01], [0.01, 0.01, 0.09]])
+    lstsq_calls = []
+    lstsq = np.linalg.lstsq
+    monkeypatch.setattr(np.linalg, 'lstsq', lambda *args, **kwargs: lstsq_calls.append(1) or lstsq(*args, **kwargs))
+    weights, _, converged = solve_long_only_qp(cov, np.ones((1, 3)), np.ones(1))
+    expected = slsqp(cov, {'type': 'eq', 'fun': lambda w: w.sum() - 1}, np.full(3, 1 / 3))
+    assert lstsq_calls
+    assert converged
+    assert weights.sum() == pytest.approx(1.0)
+    assert weights @ cov @ weights == pytest.approx(expected @ cov @ expected, rel=1e-8)
+
+
+def test_random_frontier_is_reproducible_with_a_seed():
+    mean_returns, cov = random_moments(10, 7)
+    optimizer = Optimizer.from_moments(mean_returns, cov)
+    first = optimizer.calculate_efficient_frontier(2500, chunk_size=700, seed=42).copy()
+    second = optimizer.calculate_efficient_frontier(2500, chunk_size=700, seed=42)
+    np.testing.assert_array_equal(first, second)
+    assert first.shape == (3, 2500)
+    assert not np.array_equal(first, optimizer.calculate_efficient_frontier(2500, chunk_size=700, seed=43))
+
+
+@pytest.mark.parametrize('model', ['dense', 'factor'])
+def test_frontier_chunks_match_per_row_metrics(model):
+    rng = np.random.default_rng(8)
+    returns = rng.normal(0.0004, 0.01, (400, 12))
+    mean_returns = returns.mean(axis=0) * 252
+    risk_model = DenseRiskModel(np.cov(returns, rowvar=False) * 252) if model == 'dense' else FactorRiskModel.fit(returns, 3, 252)
+    dense_cov = risk_model.to_dense()
+    chunks = list(Optimizer.from_moments(mean_returns, risk_model).iter_frontier_chunks(1000, chunk_size=300, seed=1, risk_free_rate=0.02))
+    assert [len(chunk[0]) for chunk in chunks] == [300, 300, 300, 100]
+    for weights, stddevs, portfolio_returns, sharpe_ratios in chunks:
+        np.testing.assert_allclose(weights.sum(axis=1), 1.0)
+        assert weights.min() >= 0
+        for row, stddev, portfolio_return, sharpe_ratio in zip(weights, stddevs, portfolio_returns, sharpe_ratios):
+            assert portfolio_return == pytest.approx(row @ mean_returns)
+            assert stddev ** 2 == pytest.approx(row @ dense_cov @ row)
+            assert sharpe_ratio == pytest.approx((row @ mean_returns - 0.02) / np.sqrt(row @ dense_cov @ row))
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from src.asset_data import AssetData
+from src.portfolios import Portfolios
+from src.providers import FakeProvider
+from src.risk_model import DenseRiskModel, FactorRiskModel
+
+
+@pytest.mark.parametrize('model', ['dense', 'factor'])
+def test_subset_variances_match_dense_weights(model):
+    rng = np.random.default_rng(0)
+    returns = rng.normal(0, 0.01, (300, 40))
+    risk_model = DenseRiskModel(np.cov(returns, rowvar=False)) if model == 'dense' else FactorRiskModel.fit(returns, 5)
+    indices = np.array([rng.choice(40, 6, replace=False) for _ in range(50)])
+    weights = rng.dirichlet(np.ones(6), 50)
+    dense = np.zeros((50, 40))
+    np.put_along_axis(dense, indices, weights, axis=1)
+    np.testing.assert_allclose(risk_model.subset_variances(indices, weights), risk_model.portfolio_variance(dense))
+
+
+def test_random_portfolios_are_stored_sparsely(holdings_file, tmp_path):
+    tickers = [f'T{i}' for i in range(30)]
+    asset_data = AssetData(holdings_file(tickers), cache_dir=tmp_path / 'cache', provider=FakeProvider())
+    asset_data.fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    portfolios = Portfolios(asset_data, start_date='2020-01-01', end_date='2021-01-01')
+    portfolios.create_random_portfolios(1000, num_stocks=5, seed=0, chunk_size=300)
+    assert portfolios.weights.shape == portfolios.indices.shape == (1000, 5)
+    np.testing.assert_allclose(portfolios.weights.sum(axis=1), 1.0, rtol=1e-6)
+    assert all(len(set(row)) == 5 for row in portfolios.indices)
+
+    stats = portfolios.universe_stats()
+    dense = np.zeros((1000, 30))
+    np.put_along_axis(dense, portfolios.indices, portfolios.weights, axis=1)
+    np.testing.assert_allclose(portfolios.returns, dense @ stats.mean_returns, rtol=1e-5)
+    np.testing.assert_allclose(portfolios.risks, np.sqrt(stats.risk_model.portfolio_variance(dense)), rtol=1e-5)
+
+    portfolio = portfolios.get_portfolio(0)
+    assert sorted(ticker for ticker, _ in portfolio.portfolio) == sorted(tickers[j] for j in portfolios.indices[0])
+
+    portfolios.add_portfolios([[0, 1, 2, 3, 4, 5, 6]], [[0.1, 0.1, 0.1, 0.1, 0.2, 0.2, 0.2]])
+    assert portfolios.weights.shape == (1001, 7)
+    assert len(portfolios.get_portfolio(0).portfolio) == 5
+    assert len(portfolios.get_portfolio(1000).portfolio) == 7
+
+
+def cloud(num_points, seed):
+    # A bare Portfolios holding only the (risk, return) arrays, with a few NaN/inf entries
+    rng = np.random.default_rng(seed)
+    portfolios = Portfolios(None)
+    portfolios.weights = np.ones((num_points, 1), dtype=np.float32)
+    portfolios.risks = rng.uniform(0.1, 0.4, num_points)
+    portfolios.returns = rng.normal(0.05, 0.03, num_points) + 0.3 * portfolios.risks
+    portfolios.risks[[3, 50]] = [np.nan, np.inf]
+    portfolios.returns[[7, 60, 61]] = [np.nan, np.inf, -np.inf]
+    return portfolios
+
+
+def test_efficient_frontier_points_are_the_undominated_portfolios():
+    portfolios = cloud(500, 0)
+    risks, returns = portfolios.efficient_frontier_points()
+    assert np.isfinite(risks).all() and np.isfinite(returns).all()
+    assert np.all(np.diff(risks) >= 0) and np.all(np.diff(returns) > 0)
+    finite = np.isfinite(portfolios.risks) & np.isfinite(portfolios.returns)
+    points = list(zip(portfolios.risks[finite], portfolios.returns[finite]))
+    undominated = sorted(
+        (risk, ret) for risk, ret in points
+        if not any(r <= risk and m >= ret and (r, m) != (risk, ret) for r, m in points)
+    )
+    assert list(zip(risks, returns)) == undominated
+
+
+@pytest.mark.parametrize('chunk_size', [64, 1000000])
+def test_density_counts_only_finite_points(chunk_size):
+    portfolios = cloud(1000, 1)
+    counts, risk_edges, return_edges = portfolios._density(20, chunk_size=chunk_size)
+    finite = np.isfinite(portfolios.risks) & np.isfinite(portfolios.returns)
+    assert counts.shape == (20, 20)
+    assert counts.sum() == finite.sum() == 995
+    assert np.isfinite(risk_edges).all() and np.isfinite(return_edges).all()
+    finite_risks = portfolios.risks[np.isfinite(portfolios.risks)]
+    assert (risk_edges[0], risk_edges[-1]) == (finite_risks.min(), finite_risks.max())
+    expected, _, _ = np.histogram2d(portfolios.risks[finite], portfolios.returns[finite], bins=[risk_edges, return_edges])
+    np.testing.assert_array_equal(counts, expected)
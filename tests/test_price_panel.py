@@ -0,0 +1,65 @@
+import numpy as np
+import polars as pl
+from loguru import logger
+from src.asset_data import AssetData
+from src.instrumentation import instrumentation
+from src.portfolio import Portfolio
+from src.portfolios import Portfolios
+from src.price_panel import PricePanel
+from src.price_store import DATE_COLUMN
+from src.providers import FakeProvider, StubProvider
+
+
+def histories():
+    # T2 lists in October, nine months after the others
+    fake = FakeProvider()
+    frames = {ticker: fake._history(ticker, '2020-01-01', '2021-01-01') for ticker in ['T0', 'T1', 'T2']}
+    frames['T2'] = frames['T2'].filter(pl.col(DATE_COLUMN) >= pl.date(2020, 10, 1))
+    return frames
+
+
+def test_drop_logs_removed_rows():
+    messages = []
+    handler = logger.add(messages.append, level='INFO', format='{message}')
+    frames = histories()
+    panel = PricePanel.from_histories(frames, missing='drop')
+    logger.remove(handler)
+    dropped = frames['T0'].height - panel.values.shape[0]
+    assert dropped > 0
+    assert any(f'Dropped {dropped} of' in message and 'T2' in message for message in messages)
+
+
+def test_portfolio_metrics_ignore_late_listing_outside_portfolio(holdings_file, tmp_path, monkeypatch):
+    stub = tmp_path / 'stub'
+    stub.mkdir()
+    for ticker, frame in histories().items():
+        frame.write_parquet(stub / f'{ticker}.parquet')
+    asset_data = AssetData(holdings_file(['T0', 'T1', 'T2']), cache_dir=tmp_path / 'cache', provider=StubProvider(stub))
+    monkeypatch.setattr(Portfolio, 'asset_data', None)
+    portfolio = Portfolio(asset_data, 0.0, '2020-01-01', '2021-01-01')
+    portfolio.create_portfolio([('', 'T0', 1), ('', 'T1', 1)])
+
+    returns = PricePanel.from_histories({ticker: histories()[ticker] for ticker in ['T0', 'T1']}).returns()
+    weights = np.array([0.5, 0.5])
+    assert np.isclose(portfolio.estimated_return, returns.mean(axis=0) @ weights * 252)
+    assert np.isclose(portfolio.estimated_risk, np.sqrt(weights @ np.cov(returns, rowvar=False) @ weights * 252))
+
+
+def test_portfolios_share_one_universe(holdings_file, tmp_path, monkeypatch):
+    tickers = [f'T{i}' for i in range(6)]
+    asset_data = AssetData(holdings_file(tickers), cache_dir=tmp_path / 'cache', provider=FakeProvider(), num_factors=2)
+    asset_data.fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    monkeypatch.setattr(Portfolio, 'asset_data', None)
+    instrumentation.reset()
+    risks = []
+    for i in range(len(tickers) - 1):
+        portfolio = Portfolio(asset_data, 0.0, '2020-01-01', '2021-01-01')
+        portfolio.create_portfolio([('', tickers[i], 1), ('', tickers[i + 1], 1)])
+        risks.append(portfolio.estimated_risk)
+    assert instrumentation.counters['universe.miss'] == 1
+
+    # Same factor model as the batch path: no refit on the held tickers
+    portfolios = Portfolios(asset_data, 0.0, '2020-01-01', '2021-01-01')
+    indices = np.array([[i, i + 1] for i in range(len(tickers) - 1)])
+    _, batch_risks, _ = portfolios.evaluate_weights(indices, np.full(indices.shape, 0.5))
+    np.testing.assert_allclose(risks, batch_risks)
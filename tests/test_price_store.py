@@ -0,0 +1,73 @@
+import json
+import polars as pl
+from datetime import date
+from src.price_store import DATE_COLUMN, PRICE_COLUMNS, PriceStore
+from src.providers import FakeProvider
+
+
+def history(ticker, start='2020-01-01', end='2020-03-01'):
+    return FakeProvider()._history(ticker, start, end)
+
+
+def test_write_read_round_trip(tmp_path):
+    store = PriceStore(tmp_path)
+    frame = history('AAA')
+    # Unsorted input with a duplicate date is stored sorted and de-duplicated
+    store.write('AAA', pl.concat([frame.reverse(), frame.head(1)]))
+    assert store.has('AAA')
+    assert store.tickers() == ['AAA']
+    read = store.read('AAA')
+    assert read.columns == [DATE_COLUMN, *PRICE_COLUMNS]
+    assert read.schema[DATE_COLUMN] == pl.Date
+    assert read.equals(frame)
+    assert store.read('MISSING') is None
+
+
+def test_read_filters_half_open_window(tmp_path):
+    store = PriceStore(tmp_path)
+    store.write('AAA', history('AAA'))
+    read = store.read('AAA', '2020-01-06', date(2020, 1, 10))
+    assert read[DATE_COLUMN].to_list() == [date(2020, 1, 6), date(2020, 1, 7), date(2020, 1, 8), date(2020, 1, 9)]
+    assert store.read('AAA', '2020-01-06', '2020-01-06').is_empty()
+
+
+def test_scan_and_read_many_over_partitions(tmp_path):
+    store = PriceStore(tmp_path)
+    assert store.scan() is None
+    assert store.read_many(['AAA']) == {}
+    frames = {ticker: history(ticker) for ticker in ['AAA', 'BBB', 'CCC']}
+    for ticker, frame in frames.items():
+        store.write(ticker, frame)
+    assert (tmp_path / 'ticker=BBB' / 'data.parquet').exists()
+
+    scanned = store.scan(['AAA', 'CCC'], '2020-02-03', '2020-02-05').collect()
+    assert sorted(scanned['ticker'].unique().to_list()) == ['AAA', 'CCC']
+    assert scanned.height == 4
+
+    loaded = store.read_many(['CCC', 'AAA', 'MISSING'], '2020-01-15')
+    assert sorted(loaded) == ['AAA', 'CCC']
+    for ticker, frame in loaded.items():
+        assert 'ticker' not in frame.columns
+        assert frame.equals(store.read(ticker, '2020-01-15'))
+
+
+def test_read_coverage(tmp_path):
+    store = PriceStore(tmp_path)
+    assert store.read_coverage('AAA') is None
+    store.write('AAA', history('AAA'), coverage=('2019-12-01', '2020-03-01'))
+    assert store.read_coverage('AAA') == (date(2019, 12, 1), date(2020, 3, 1))
+    assert json.loads((tmp_path / 'ticker=AAA' / 'coverage.json').read_text()) == {'start': '2019-12-01', 'end': '2020-03-01'}
+
+
+def test_read_coverage_falls_back_to_held_dates(tmp_path):
+    # Files written before coverage.json existed cover [first date, last date + 1 day)
+    store = PriceStore(tmp_path)
+    frame = history('AAA')
+    store.write('AAA', frame)
+    assert not (tmp_path / 'ticker=AAA' / 'coverage.json').exists()
+    assert store.read_coverage('AAA') == (date(2020, 1, 1), date(2020, 2, 29))
+    assert frame[DATE_COLUMN].max() == date(2020, 2, 28)
+
+    # An empty file held no dates, so nothing counts as covered
+    store.write('BBB', frame.clear())
+    assert store.read_coverage('BBB') is None
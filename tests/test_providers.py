@@ -0,0 +1,177 @@
+import time
+from datetime import date, timedelta
+import pytest
+from src.asset_data import AssetData
+from src.providers import AlphaVantageProvider, FailoverProvider, FakeProvider, PolygonProvider, RateLimiter
+
+
+class FlakyProvider(FakeProvider):
+    # Fails the first `failures` requests, and every request for tickers in `broken`
+    def __init__(self, failures=0, broken=(), **kwargs):
+        super().__init__(**kwargs)
+        self.remaining_failures = failures
+        self.broken = set(broken)
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        if ticker_symbol in self.broken:
+            raise ConnectionError(f'{ticker_symbol} unavailable')
+        if self.remaining_failures:
+            self.remaining_failures -= 1
+            raise ConnectionError('temporary failure')
+        return super().fetch_history(ticker_symbol, start_date, end_date)
+
+
+def test_failed_ticker_keeps_the_rest_of_the_batch():
+    provider = FlakyProvider(broken={'BAD'}, supports_batch=False, max_retries=1)
+    histories = provider.fetch_batch(['A', 'B', 'BAD', 'C'], '2020-01-01', '2020-02-01')
+    assert sorted(histories) == ['A', 'B', 'C']
+    assert all(history.height > 0 for history in histories.values())
+
+
+def test_batch_failure_returns_nothing():
+    provider = FakeProvider(failure_rate=1.0, max_retries=0)
+    assert provider.fetch_batch(['A', 'B'], '2020-01-01', '2020-02-01') == {}
+
+
+@pytest.mark.parametrize('supports_batch, expected_calls', [(True, 3), (False, 25)])
+def test_fetch_all_groups_tickers_into_batches(holdings_file, tmp_path, supports_batch, expected_calls):
+    tickers = [f'T{i}' for i in range(25)]
+    provider = FakeProvider(supports_batch=supports_batch, max_batch_size=10)
+    asset_data = AssetData(holdings_file(tickers), cache_dir=tmp_path / 'cache', provider=provider)
+    histories = asset_data.fetch_all_stock_histories('2020-01-01', '2020-03-01')
+    assert provider.calls == expected_calls
+    assert sorted(histories) == sorted(tickers)
+    assert all(history.height > 0 for history in histories.values())
+
+
+def test_thread_pool_overlaps_requests(holdings_file, tmp_path):
+    tickers = [f'T{i}' for i in range(8)]
+    results = {}
+    for workers in (1, 8):
+        provider = FakeProvider(latency=0.1, supports_batch=False)
+        asset_data = AssetData(holdings_file(tickers), cache_dir=tmp_path / f'cache-{workers}', provider=provider)
+        start = time.perf_counter()
+        results[workers] = asset_data.fetch_all_stock_histories('2020-01-01', '2020-03-01', max_workers=workers)
+        results[workers, 'elapsed'] = time.perf_counter() - start
+    assert results[8, 'elapsed'] < results[1, 'elapsed'] / 2
+    assert all(results[1][ticker].equals(results[8][ticker]) for ticker in tickers)
+
+
+def test_retries_with_exponential_backoff():
+    provider = FlakyProvider(failures=2, supports_batch=False, max_retries=3, backoff=0.05)
+    start = time.perf_counter()
+    histories = provider.fetch_batch(['A'], '2020-01-01', '2020-02-01')
+    # Delays are backoff * 2**attempt * (1 + jitter): at least 0.05 + 0.10
+    assert time.perf_counter() - start >= 0.15
+    assert histories['A'].height > 0
+
+
+def test_gives_up_after_max_retries():
+    provider = FlakyProvider(failures=3, supports_batch=False, max_retries=2, backoff=0.0)
+    assert provider.fetch_batch(['A'], '2020-01-01', '2020-02-01') == {}
+    assert provider.remaining_failures == 0
+
+
+def test_rate_limiter_spaces_calls():
+    limiter = RateLimiter(20, burst=1)
+    start = time.perf_counter()
+    for _ in range(11):
+        limiter.acquire()
+    assert time.perf_counter() - start >= 0.45
+
+
+def test_provider_rate_limit_applies_to_every_request():
+    provider = FakeProvider(supports_batch=False, rate_limit=20)
+    start = time.perf_counter()
+    provider.fetch_batch([f'T{i}' for i in range(30)], '2020-01-01', '2020-01-10')
+    # The bucket starts with a burst of 20 tokens, the remaining 10 requests wait 1/20 s each
+    assert time.perf_counter() - start >= 0.45
+
+
+class RecordingProvider(FakeProvider):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.requested = []
+
+    def fetch_history(self, ticker_symbol, start_date, end_date):
+        self.requested.append(ticker_symbol)
+        return super().fetch_history(ticker_symbol, start_date, end_date)
+
+
+def test_failover_only_retries_failed_tickers_of_non_batch_provider():
+    primary = FlakyProvider(broken={'BAD'}, supports_batch=False, max_retries=0)
+    backup = RecordingProvider(supports_batch=False)
+    histories = FailoverProvider([primary, backup]).fetch_batch(['A', 'BAD', 'C'], '2020-01-01', '2020-02-01')
+    assert sorted(histories) == ['A', 'BAD', 'C']
+    assert backup.requested == ['BAD']
+
+
+def test_failover_rejects_mixed_adjustment():
+    with pytest.raises(ValueError):
+        FailoverProvider([FakeProvider(), PolygonProvider(api_key='key', adjusted=False)])
+
+
+class FakeResponse:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class FakeSession:
+    def __init__(self, payload):
+        self.payload = payload
+        self.params = None
+
+    def get(self, url, timeout=None, params=None):
+        self.params = params
+        return FakeResponse(self.payload)
+
+
+def test_alpha_vantage_scales_prices_to_adjusted_close():
+    bar = {'1. open': '100', '2. high': '110', '3. low': '90', '4. close': '105',
+           '5. adjusted close': '52.5', '6. volume': '1000', '7. dividend amount': '0', '8. split coefficient': '1'}
+    session = FakeSession({'Time Series (Daily)': {'2020-01-02': bar, '2019-12-31': bar}})
+    provider = AlphaVantageProvider(api_key='key')
+    provider.session = session
+    history = provider.fetch_history('AAA', '2020-01-01', '2020-02-01')
+    assert session.params['function'] == 'TIME_SERIES_DAILY_ADJUSTED'
+    assert session.params['outputsize'] == 'full'
+    assert history.height == 1
+    row = history.row(0, named=True)
+    assert (row['Open'], row['High'], row['Low'], row['Close'], row['Volume']) == (50.0, 55.0, 45.0, 52.5, 1000.0)
+
+
+def test_alpha_vantage_compact_output_for_recent_windows():
+    provider = AlphaVantageProvider(api_key='key')
+    assert provider._outputsize(date.today() - timedelta(days=5)) == 'compact'
+    assert provider._outputsize(date.today() - timedelta(days=400)) == 'full'
+    assert AlphaVantageProvider(api_key='key', outputsize='full')._outputsize(date.today()) == 'full'
+
+
+class CountingSession(FakeSession):
+    def __init__(self, payload):
+        super().__init__(payload)
+        self.calls = 0
+
+    def get(self, url, timeout=None, params=None):
+        self.calls += 1
+        return super().get(url, timeout, params)
+
+
+def test_alpha_vantage_information_is_not_retried():
+    provider = AlphaVantageProvider(api_key='key', max_retries=3, backoff=0.0, rate_limit=None)
+    provider.session = CountingSession({'Information': 'Invalid API key'})
+    assert provider.fetch_batch(['AAA'], '2020-01-01', '2020-02-01') == {}
+    assert provider.session.calls == 1
+
+
+def test_alpha_vantage_throttling_note_is_retried():
+    provider = AlphaVantageProvider(api_key='key', max_retries=2, backoff=0.0, rate_limit=None)
+    provider.session = CountingSession({'Note': 'Thank you for using Alpha Vantage'})
+    assert provider.fetch_batch(['AAA'], '2020-01-01', '2020-02-01') == {}
+    assert provider.session.calls == 3
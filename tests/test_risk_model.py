@@ -0,0 +1,37 @@
+import numpy as np
+from src.risk_model import FactorRiskModel, _top_singular
+
+
+def factor_returns(num_obs=20000, num_assets=60, seed=0):
+    # Three well separated factors plus independent specific noise
+    rng = np.random.default_rng(seed)
+    loadings = rng.normal(0, 1, (num_assets, 3)) * np.array([3.0, 2.0, 1.5])
+    factor_variances = np.full(3, 1e-4)
+    specific_variances = rng.uniform(0.5e-4, 2e-4, num_assets)
+    returns = (rng.normal(0, 1, (num_obs, 3)) * np.sqrt(factor_variances)) @ loadings.T
+    returns += rng.normal(0, 1, (num_obs, num_assets)) * np.sqrt(specific_variances)
+    return returns, loadings, factor_variances, specific_variances
+
+
+def test_fit_recovers_known_factor_structure():
+    returns, loadings, factor_variances, specific_variances = factor_returns()
+    model = FactorRiskModel.fit(returns, num_factors=3)
+
+    # Fitted loadings span the true factor space (principal angles near zero)
+    true_basis = np.linalg.qr(loadings)[0]
+    cosines = np.linalg.svd(true_basis.T @ model.loadings, compute_uv=False)
+    assert cosines.min() > 0.999
+
+    # PCA folds a little specific noise into the factors, so specific variances run slightly low
+    np.testing.assert_allclose(model.specific_variances, specific_variances, rtol=0.2)
+    true_cov = (loadings * factor_variances) @ loadings.T + np.diag(specific_variances)
+    np.testing.assert_allclose(model.to_dense(), true_cov, atol=0.05 * np.abs(true_cov).max())
+
+
+def test_truncated_svd_matches_full_svd():
+    returns = factor_returns(num_obs=500, num_assets=200)[0]
+    centered = returns - returns.mean(axis=0)
+    singular_values, components = _top_singular(centered, 3)
+    _, expected_values, expected_components = np.linalg.svd(centered, full_matrices=False)
+    np.testing.assert_allclose(singular_values, expected_values[:3], rtol=1e-8)
+    np.testing.assert_allclose(np.abs((components * expected_components[:3]).sum(axis=1)), 1.0, atol=1e-6)
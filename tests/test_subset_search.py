@@ -0,0 +1,88 @@
+import time
+from itertools import combinations
+import numpy as np
+import pytest
+import src.subset_search as subset_search
+from src.risk_model import DenseRiskModel
+from src.subset_search import SubsetSearch, score_subset
+
+
+def moments():
+    # Asset 2 has a negative tangency weight, so scoring goes through the long-only QP
+    mean_returns = np.array([0.10, 0.12, 0.02, 0.08])
+    cov = np.array([
+        [0.04, 0.01, 0.018, 0.00],
+        [0.01, 0.09, 0.025, 0.01],
+        [0.018, 0.025, 0.03, 0.00],
+        [0.00, 0.01, 0.00, 0.05],
+    ])
+    return mean_returns, DenseRiskModel(cov)
+
+
+def test_unconverged_qp_falls_back_to_slsqp(monkeypatch):
+    mean_returns, risk_model = moments()
+    idx = np.arange(4)
+    expected, expected_weights = score_subset(mean_returns, risk_model, idx)
+    assert expected_weights[2] == 0
+
+    monkeypatch.setattr(subset_search, 'solve_long_only_qp', lambda cov, A, b: (np.full(4, -1.0), np.ones(4, bool), False))
+    sharpe_ratio, weights = score_subset(mean_returns, risk_model, idx)
+    assert sharpe_ratio == pytest.approx(expected, rel=1e-6)
+    np.testing.assert_allclose(weights, expected_weights, atol=1e-4)
+
+
+def test_subset_scores_minus_infinity_when_no_solver_converges(monkeypatch):
+    mean_returns, risk_model = moments()
+    monkeypatch.setattr(subset_search, 'solve_long_only_qp', lambda cov, A, b: (np.full(4, -1.0), np.ones(4, bool), False))
+    monkeypatch.setattr(subset_search, '_solve_slsqp', lambda cov, excess: None)
+    assert score_subset(mean_returns, risk_model, np.arange(4)) == (-np.inf, None)
+
+
+def universe(num_tickers=14, seed=12):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0004, 0.01, (400, num_tickers)) + rng.normal(0, 0.008, (400, 1)) * rng.uniform(0, 1.5, num_tickers)
+    return returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+
+def brute_force(mean_returns, cov, num_assets):
+    risk_model = DenseRiskModel(cov)
+    scores = {}
+    for idx in combinations(range(len(mean_returns)), num_assets):
+        score, weights = score_subset(mean_returns, risk_model, idx)
+        if np.isfinite(score):
+            held = tuple(np.array(idx)[weights > 1e-10])
+            scores[held] = max(score, scores.get(held, -np.inf))
+    return sorted(scores.items(), key=lambda item: -item[1])
+
+
+def test_search_finds_brute_force_optimum():
+    mean_returns, cov = universe()
+    expected = brute_force(mean_returns, cov, 4)
+    results = SubsetSearch(mean_returns, cov, max_workers=1).search(4, top_k=3, max_restarts=6, time_budget=30, seed=0)
+    assert tuple(results[0]['indices']) == expected[0][0]
+    assert results[0]['sharpe_ratio'] == pytest.approx(expected[0][1])
+    scores = [result['sharpe_ratio'] for result in results]
+    assert scores == sorted(scores, reverse=True)
+    # No result is a weaker subset of another, e.g. a greedy prefix of the winner
+    held = [set(result['indices']) for result in results]
+    assert not any(a < b for a in held for b in held)
+    assert all(len(result['indices']) <= 4 for result in results)
+
+
+def test_search_stops_early_without_improvement():
+    mean_returns, cov = universe()
+    search = SubsetSearch(mean_returns, cov, max_workers=1)
+    search.search(4, top_k=1, max_restarts=50, time_budget=30, patience=2, seed=0)
+    # Each restart scores many subsets; 50 restarts would be far more than a few patience rounds
+    few = search.evaluations
+    exhaustive = SubsetSearch(mean_returns, cov, max_workers=1)
+    exhaustive.search(4, top_k=1, max_restarts=50, time_budget=30, patience=50, seed=0)
+    assert few < exhaustive.evaluations / 5
+
+
+def test_search_respects_time_budget():
+    mean_returns, cov = universe(num_tickers=60)
+    start = time.perf_counter()
+    results = SubsetSearch(mean_returns, cov, max_workers=1).search(10, top_k=2, max_restarts=1000, time_budget=1.0, seed=0)
+    assert time.perf_counter() - start < 5
+    assert results
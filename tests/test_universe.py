@@ -0,0 +1,54 @@
+import numpy as np
+from src.asset_data import AssetData
+from src.covariance import CovarianceEstimator
+from src.instrumentation import instrumentation
+from src.providers import FakeProvider
+
+TICKERS = [f'T{i}' for i in range(8)]
+
+
+def make_asset_data(holdings_file, tmp_path, shrinkage=None):
+    return AssetData(holdings_file(TICKERS), cache_dir=tmp_path / 'cache', provider=FakeProvider(), shrinkage=shrinkage)
+
+
+def test_persisted_estimator_is_extended_with_new_days_only(holdings_file, tmp_path, monkeypatch):
+    make_asset_data(holdings_file, tmp_path).fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    first = make_asset_data(holdings_file, tmp_path).get_universe_stats('2020-01-01', '2020-07-01')
+    assert len(list((tmp_path / 'cache' / 'estimators').glob('*.npz'))) == 1
+
+    updated = []
+    update = CovarianceEstimator.update
+    monkeypatch.setattr(CovarianceEstimator, 'update', lambda self, rows, last_date=None: updated.append(len(rows)) or update(self, rows, last_date))
+    instrumentation.reset()
+    # A new AssetData stands in for a restart: the estimator comes back from disk
+    stats = make_asset_data(holdings_file, tmp_path).get_universe_stats('2020-01-01', '2021-01-01')
+    assert instrumentation.counters['estimator.hit'] == 1
+    assert updated == [len(stats.dates) - len(first.dates)]
+
+    returns = stats.returns
+    np.testing.assert_allclose(stats.cov_matrix, np.cov(returns, rowvar=False) * 252)
+    np.testing.assert_allclose(stats.mean_returns, returns.mean(axis=0) * 252)
+
+
+def test_shorter_window_does_not_replace_persisted_estimator(holdings_file, tmp_path):
+    asset_data = make_asset_data(holdings_file, tmp_path, shrinkage='ledoit_wolf')
+    asset_data.fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    full = asset_data.get_universe_stats('2020-01-01', '2021-01-01')
+    short = asset_data.get_universe_stats('2020-01-01', '2020-04-01')
+    assert short.estimator.count == len(short.dates) < full.estimator.count
+    path, = (tmp_path / 'cache' / 'estimators').glob('*.npz')
+    assert CovarianceEstimator.load(path).count == full.estimator.count
+
+
+def test_stale_estimator_is_rebuilt(holdings_file, tmp_path):
+    asset_data = make_asset_data(holdings_file, tmp_path)
+    asset_data.fetch_all_stock_histories('2020-01-01', '2021-01-01')
+    stats = asset_data.get_universe_stats('2020-01-01', '2020-07-01')
+    path, = (tmp_path / 'cache' / 'estimators').glob('*.npz')
+    stats.estimator.total += 1.0
+    stats.estimator.save(path)
+
+    instrumentation.reset()
+    rebuilt = make_asset_data(holdings_file, tmp_path).get_universe_stats('2020-01-01', '2021-01-01')
+    assert instrumentation.counters['estimator.miss'] == 1
+    np.testing.assert_allclose(rebuilt.cov_matrix, np.cov(rebuilt.returns, rowvar=False) * 252)
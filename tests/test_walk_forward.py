@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+from src.asset_data import AssetData
+from src.optimizer import Optimizer
+from src.providers import FakeProvider
+from src.walk_forward import WalkForward
+
+
+def test_step_shorter_than_test_window_is_rejected():
+    with pytest.raises(ValueError):
+        WalkForward(None, tickers=['A'], train_days=100, test_days=21, step_days=5)
+
+
+@pytest.mark.parametrize('step_days', [None, 21, 30])
+def test_test_windows_do_not_overlap(step_days):
+    windows = WalkForward(None, tickers=['A'], train_days=100, test_days=21, step_days=step_days).windows(500)
+    test_days = [day for _, train_end, test_end in windows for day in range(train_end, test_end)]
+    assert len(test_days) == len(set(test_days))
+    assert windows[-1][2] <= 500
+
+
+@pytest.mark.parametrize('step_days', [21, 40])
+def test_run_matches_max_sharpe_from_scratch(holdings_file, tmp_path, step_days):
+    tickers = [f'T{i}' for i in range(6)]
+    asset_data = AssetData(holdings_file(tickers), cache_dir=tmp_path / 'cache', provider=FakeProvider())
+    asset_data.fetch_all_stock_histories('2019-01-01', '2021-01-01')
+    walk_forward = WalkForward(asset_data, start_date='2019-01-01', end_date='2021-01-01', train_days=120,
+                               test_days=21, step_days=step_days, risk_free_rate=0.01, max_workers=2)
+    results = walk_forward.run()
+
+    returns = asset_data.build_price_panel(tickers, '2019-01-01', '2021-01-01').returns()
+    windows = walk_forward.windows(returns.shape[0])
+    assert len(results['weights']) == len(windows) > 4
+    oos_returns = []
+    for weights, (a, b, c) in zip(results['weights'], windows):
+        # Fresh moments on the training rows, no incremental sliding
+        optimizer = Optimizer.from_moments(returns[a:b].mean(axis=0) * 252, np.cov(returns[a:b], rowvar=False) * 252)
+        np.testing.assert_allclose(weights, optimizer.calculate_max_sharpe(0.01)['weights'], atol=1e-8)
+        growth = np.cumprod(1 + returns[b:c], axis=0) @ weights
+        oos_returns.append(growth / np.concatenate([[1.0], growth[:-1]]) - 1)
+    np.testing.assert_allclose(results['oos_returns'], np.concatenate(oos_returns))
+    np.testing.assert_allclose(results['equity'], np.cumprod(1 + np.concatenate(oos_returns)))
+    assert len(results['oos_dates']) == len(results['oos_returns'])